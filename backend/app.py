@@ -1,31 +1,267 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from googleapiclient.errors import HttpError
 from pydantic import BaseModel
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import TextVectorization
-import pickle
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
 import numpy as np
-from typing import List
-from comments_scrapper import get_comments
+from typing import List, Literal, Optional
+from batcher import InferenceBatcher
+from dedup import fold_texts
+from metrics import BATCH_SIZE, COMMENTS_SCORED, REGISTRY, TraceMiddleware, stage, trace_count
+from length_buckets import predict_bucketed
+from model_loader import ModelArtifacts
+from worker_pool import WorkerPool
+from postprocess import apply_thresholds, format_results, row_results
+from prediction_cache import PredictionCache, SqliteCacheBackend
+from comment_store import CommentStore, refresh_video
+from comments_scrapper import close_fetcher, get_comments, get_fetcher, parse_video_id
+from file_scoring import FileRows, csv_chunk, csv_header, detect_file_type, ndjson_chunk
+from job_queue import JobQueue, JobStore, QuotaBudget
 
-# Load vectorizer config and vocab instead of the entire object
-with open('vectorizer.pkl', 'rb') as f:
-    config, vocab = pickle.load(f)
+# Model and vectorizer load lazily (see model_loader.py): from the bundle
+# written by model_core/model_bundle.py if present, else vectorizer.pkl +
+# toxicity.h5. Importing this module stays fast, which keeps --reload usable.
+ARTIFACT_SETTINGS = dict(
+    bundle_path=os.getenv("MODEL_BUNDLE_PATH", "toxicity_bundle"),
+    model_path=os.getenv("MODEL_PATH", "toxicity.h5"),
+    vectorizer_path=os.getenv("VECTORIZER_PATH", "vectorizer.pkl"),
+    # "tflite" serves the quantized export from model_core/export_tflite.py
+    engine=os.getenv("INFERENCE_ENGINE", "keras"),
+    tflite_path=os.getenv("TFLITE_MODEL_PATH", "toxicity.tflite"),
+    tflite_threads=int(os.getenv("TFLITE_THREADS", "0")) or None,
+    # "numpy" tokenizes with tokenizer.py instead of the TextVectorization
+    # layer; opt in once check_tokenizer_parity.py passes for this vectorizer
+    tokenizer=os.getenv("TOKENIZER", "tf"),
+)
+
+# INFERENCE_WORKERS > 0 runs the model in that many worker processes (see
+# worker_pool.py); this process then only loads the vectorizer.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_WORKER_THREADS = int(os.getenv("INFERENCE_WORKER_THREADS", "0"))
 
-# Rebuild the vectorizer
-vectorizer = TextVectorization.from_config(config)
-vectorizer.set_vocabulary(vocab)
+artifacts = ModelArtifacts(**ARTIFACT_SETTINGS, load_model=not INFERENCE_WORKERS)
 
-# Load trained model
-model = load_model('toxicity.h5')
 # Add this near the top of the file with other imports and configurations
 # Define class-specific thresholds
-THRESHOLDS = [0.5, 0.4, 0.5, 0.3, 0.5, 0.4]
+THRESHOLDS = artifacts.thresholds or [0.5, 0.4, 0.5, 0.3, 0.5, 0.4]
 CLASS_NAMES = ['toxic', 'severe_toxic', 'obscene', 'threat', 'insult', 'identity_hate']
 
+# Tuned thresholds written by model_core/threshold_sweep.py replace the defaults
+THRESHOLDS_PATH = os.getenv("THRESHOLDS_PATH", "thresholds.json")
+if os.path.exists(THRESHOLDS_PATH):
+    with open(THRESHOLDS_PATH) as f:
+        tuned = json.load(f)
+    if tuned["class_names"] != CLASS_NAMES:
+        raise ValueError(f"{THRESHOLDS_PATH} class order {tuned['class_names']} does not match {CLASS_NAMES}")
+    THRESHOLDS = tuned["thresholds"]
+
+# Per-comment console logging is expensive on large batches; opt in with LOG_COMMENTS=1
+LOG_COMMENTS = os.getenv("LOG_COMMENTS", "0") == "1"
+logger = logging.getLogger("toxicity")
+# uvicorn leaves the root logger unconfigured, so info lines need a handler here
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+logger.propagate = False
+
+
+def log_predictions(texts, predictions):
+    if not LOG_COMMENTS:
+        return
+    for text, raw_pred in zip(texts, np.round(np.asarray(predictions, dtype=np.float64), 2).tolist()):
+        logger.info("Comment: %s | Prediction: %s", text, raw_pred)
+
+# Micro-batching: concurrent requests are merged into shared model calls
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Trim padding and group comments into length buckets before the LSTM.
+# Off by default: run model_core/check_length_parity.py against the deployed
+# model first, since the model was trained on fixed 1800-token padding.
+DYNAMIC_SEQUENCE_LENGTH = os.getenv("DYNAMIC_SEQUENCE_LENGTH", "0") == "1"
+if DYNAMIC_SEQUENCE_LENGTH and artifacts.engine != "keras":
+    # The TFLite export has a fixed input length
+    logger.warning("DYNAMIC_SEQUENCE_LENGTH is ignored with INFERENCE_ENGINE=%s", artifacts.engine)
+    DYNAMIC_SEQUENCE_LENGTH = False
+
+
+worker_pool = WorkerPool(
+    INFERENCE_WORKERS,
+    ARTIFACT_SETTINGS,
+    max_rows=BATCH_MAX_SIZE,
+    num_classes=len(CLASS_NAMES),
+    threads_per_worker=INFERENCE_WORKER_THREADS,
+    dynamic_length=DYNAMIC_SEQUENCE_LENGTH,
+) if INFERENCE_WORKERS else None
+
+
+def predict_tokens(tokens):
+    return artifacts.predict(tokens, batch_size=BATCH_MAX_SIZE)
+
+
+def ensure_ready():
+    # Blocks the calling thread until the vectorizer, model and workers are up
+    artifacts.ensure_loaded()
+    if worker_pool is not None:
+        worker_pool.start(artifacts.sequence_length)
+
+
+def tokenize_into(texts, out):
+    with stage("vectorize"):
+        return artifacts.tokenize(texts, out=out)
+
+
+def run_model(texts):
+    # Runs on the batcher's inference threads, never on the event loop.
+    # Blocks here, not on the event loop, if the model is still loading.
+    ensure_ready()
+    BATCH_SIZE.observe(len(texts))
+    COMMENTS_SCORED.inc(len(texts))
+    if worker_pool is not None:
+        # Tokens go straight into the worker's shared memory, and workers
+        # apply length bucketing themselves
+        return worker_pool.predict(texts, tokenize_into)
+    with stage("vectorize"):
+        tokens = artifacts.tokenize(texts)
+    with stage("predict"):
+        if DYNAMIC_SEQUENCE_LENGTH:
+            return predict_bucketed(predict_tokens, tokens)
+        return predict_tokens(tokens)
+
+
+# One batch in flight per worker process
+batcher = InferenceBatcher(
+    run_model,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_in_flight=INFERENCE_WORKERS or 1,
+)
+
+# Read at scrape time only
+REGISTRY.gauge("toxicity_batch_queue_depth", "Scoring calls waiting for a model batch",
+               lambda: batcher.queue_depth)
+REGISTRY.gauge("toxicity_batches_in_flight", "Model batches currently running",
+               lambda: batcher.in_flight)
+
+# Cache of raw scores keyed by normalized text + model version. Set
+# PREDICTION_CACHE_DB to a file path to keep it across restarts.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "86400"))
+PREDICTION_CACHE_DB = os.getenv("PREDICTION_CACHE_DB")
+
+prediction_cache = PredictionCache(
+    f"{artifacts.version}:dynamic={DYNAMIC_SEQUENCE_LENGTH}",
+    max_entries=PREDICTION_CACHE_SIZE,
+    ttl_seconds=PREDICTION_CACHE_TTL,
+    backend=SqliteCacheBackend(PREDICTION_CACHE_DB) if PREDICTION_CACHE_DB else None,
+)
+
+
+async def score_texts(texts):
+    # Only cache misses go to the model; repeats within a call are scored once
+    if PREDICTION_CACHE_SIZE <= 0:
+        trace_count("comments_scored", len(texts))
+        with stage("inference_wait"):
+            return await batcher.submit(texts)
+
+    # Hashing and SQLite lookups stay off the event loop
+    keys, scores = await run_in_threadpool(prediction_cache.get_many, texts)
+    missing = {}
+    for i, row in enumerate(scores):
+        if row is None:
+            missing.setdefault(keys[i], []).append(i)
+
+    if missing:
+        first_rows = [rows[0] for rows in missing.values()]
+        trace_count("comments_scored", len(first_rows))
+        # Queueing plus the shared batch's vectorize/predict time
+        with stage("inference_wait"):
+            fresh = await batcher.submit([texts[i] for i in first_rows])
+        await run_in_threadpool(prediction_cache.put_many, list(missing), fresh)
+        for rows, row_scores in zip(missing.values(), fresh):
+            for i in rows:
+                scores[i] = row_scores
+
+    return np.array(scores, dtype=np.float32)
+
+
+# Duplicates are folded before the model: exact ones (same text after the
+# vectorizer's normalization) always, and near-duplicates (spam variants
+# with the same words but different emoji, symbols or spacing) at this
+# MinHash similarity. Near-duplicates share a score that is not exactly
+# their own, so /predict/, where every text is asked about on purpose,
+# folds exact duplicates only unless PREDICT_NEAR_DUPLICATE_THRESHOLD is set.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+PREDICT_NEAR_DUPLICATE_THRESHOLD = float(os.getenv("PREDICT_NEAR_DUPLICATE_THRESHOLD", "0"))
+
+
+async def fold_comments(texts, occurrences=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    with stage("dedup"):
+        return await run_in_threadpool(fold_texts, texts, occurrences, threshold)
+
+
+async def fold_and_score(texts, occurrences=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Score one representative per duplicate cluster; returns ``(scores, dedup_stats)``."""
+    folding = await fold_comments(texts, occurrences, threshold)
+    scores = await score_texts(folding.representative_texts())
+    return folding.expand(scores), folding.stats()
+
 # Set up FastAPI app
 app = FastAPI()
 
+# TRACE_LOG=1 logs one JSON line per request with its stage timings and
+# counts (comments scored, YouTube calls, quota errors)
+TRACE_LOG = os.getenv("TRACE_LOG", "0") == "1"
+trace_logger = logging.getLogger("toxicity.trace")
+if TRACE_LOG:
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.addHandler(logging.StreamHandler())
+    trace_logger.propagate = False
+
+app.add_middleware(
+    TraceMiddleware,
+    on_trace=(lambda record: trace_logger.info(json.dumps(record))) if TRACE_LOG else None,
+)
+
+
+@app.on_event("startup")
+async def start_batcher():
+    await batcher.start()
+    await job_queue.start()
+    # Load and warm up in the background so /health answers immediately
+    threading.Thread(target=load_artifacts, name="model-loader", daemon=True).start()
+
+
+def load_artifacts():
+    try:
+        ensure_ready()
+    except Exception as e:
+        logger.error("Model loading failed: %s", e)
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await job_queue.stop()
+    job_queue.store.close()
+    await batcher.stop()
+    if worker_pool is not None:
+        worker_pool.close()
+    close_fetcher()
+    if prediction_cache.backend is not None:
+        prediction_cache.backend.close()
+    if comment_store is not None:
+        comment_store.close()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,6 +272,8 @@ app.add_middleware(
 
 class TextRequest(BaseModel):
     texts: List[str] 
+    # Compact layouts for large batches, see postprocess.columnar_results
+    response_format: Literal["rows", "columnar", "columnar_f16"] = "rows"
 
 @app.post("/predict/")
 async def predict(request: TextRequest):
@@ -44,96 +282,411 @@ async def predict(request: TextRequest):
         if not request.texts:
             raise HTTPException(status_code=400, detail="No text provided")
 
-        # Vectorize all inputs
-        vectorized_texts = vectorizer(request.texts)
-
-        # Make predictions for all texts
-        predictions = model.predict(vectorized_texts)
-        
-        # Print raw predictions before converting to binary
-        for text, raw_pred in zip(request.texts, predictions):
-            print(f"Comment: {text}")
-            print(f"Prediction : {[float(f'{x:.2f}') for x in raw_pred]}")
-            print("-" * 50)
-        
-        # Apply class-specific thresholds instead of fixed 0.5
-        binary_predictions = []
-        for pred in predictions:
-            # Apply each threshold to the corresponding class prediction
-            binary_pred = [(float(pred[i]) > THRESHOLDS[i]) for i in range(len(THRESHOLDS))]
-            binary_predictions.append([int(x) for x in binary_pred])
-        
-        # Return predictions with original texts
-        return {
-            "predictions": [
-                {
-                    "text": text,
-                    "prediction": pred,
-                    "raw_scores": [float(f'{x:.4f}') for x in raw_pred],
-                    "class_names": CLASS_NAMES
-                }
-                for text, pred, raw_pred in zip(request.texts, binary_predictions, predictions)
-            ]
-        }
+        # Duplicates are scored once, cached scores are reused, and misses
+        # go through the shared batch queue
+        predictions, dedup_stats = await fold_and_score(request.texts, threshold=PREDICT_NEAR_DUPLICATE_THRESHOLD)
+        log_predictions(request.texts, predictions)
+
+        # Thresholds and rounding are applied to the whole matrix at once;
+        # JSONResponse skips FastAPI's per-object jsonable_encoder pass
+        with stage("postprocess"):
+            results = format_results(request.texts, predictions, THRESHOLDS, CLASS_NAMES, request.response_format)
+        with stage("serialize"):
+            return JSONResponse({"predictions": results, "dedup": dedup_stats})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Bulk file scoring: rows are parsed, scored and written back this many at
+# a time, so memory stays flat regardless of file size
+FILE_CHUNK_ROWS = int(os.getenv("FILE_CHUNK_ROWS", "1024"))
+# Raw request bodies beyond this many bytes are spooled to disk
+FILE_SPOOL_BYTES = 1024 * 1024
+
+
+async def stream_scored_file(rows, output):
+    if output == "csv":
+        yield csv_header(rows.columns, CLASS_NAMES)
+
+    # The next chunk is parsed while the current one is scored
+    next_chunk = asyncio.ensure_future(run_in_threadpool(rows.read_chunk, FILE_CHUNK_ROWS))
+    try:
+        while True:
+            chunk = await next_chunk
+            if not chunk:
+                break
+            next_chunk = asyncio.ensure_future(run_in_threadpool(rows.read_chunk, FILE_CHUNK_ROWS))
+
+            scores = await score_texts(rows.texts(chunk))
+            with stage("serialize"):
+                if output == "csv":
+                    body = csv_chunk(chunk, scores)
+                else:
+                    body = ndjson_chunk(rows.columns, chunk, scores, CLASS_NAMES)
+            yield body
+    finally:
+        next_chunk.cancel()
+
+
+@app.post("/score-file/")
+async def score_file(
+    request: Request,
+    output: Literal["csv", "ndjson"] = "csv",
+    file_type: Optional[Literal["txt", "csv"]] = None,
+    text_column: Optional[str] = None,
+):
+    # Accepts a multipart upload (field "file") or the file as the raw body.
+    # Either way the upload is spooled to disk rather than held in memory.
+    content_type = request.headers.get("content-type", "")
+    form = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            await form.close()
+            raise HTTPException(status_code=400, detail='Expected a file in the "file" field')
+        source, filename, content_type = upload.file, upload.filename or "", upload.content_type or ""
+    else:
+        source = tempfile.SpooledTemporaryFile(max_size=FILE_SPOOL_BYTES)
+        async for block in request.stream():
+            source.write(block)
+        source.seek(0)
+        filename = request.headers.get("x-filename", "")
+
+    async def cleanup():
+        if form is not None:
+            await form.close()
+        else:
+            source.close()
+
+    try:
+        rows = await run_in_threadpool(
+            FileRows, source, file_type or detect_file_type(filename, content_type), text_column
+        )
+    except ValueError as e:
+        await cleanup()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type = "text/csv" if output == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_scored_file(rows, output), media_type=media_type, background=BackgroundTask(cleanup))
+
+
+@app.get("/health")
+async def health():
+    # 503 until the model is loaded and warmed up, for readiness probes
+    status = artifacts.status()
+    if worker_pool is not None:
+        status["worker_pool"] = worker_pool.status()
+        if status["status"] == "ready" and worker_pool.state != "ready":
+            status["status"] = "failed" if worker_pool.state == "failed" else "loading"
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return prediction_cache.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 class YouTubeRequest(BaseModel):
     links: List[str]
+    response_format: Literal["rows", "columnar", "columnar_f16"] = "rows"
+
+
+# Videos fetched at the same time across all requests; reply threads are
+# additionally bounded by the fetcher's own worker pool
+MAX_PARALLEL_VIDEOS = int(os.getenv("MAX_PARALLEL_VIDEOS", "4"))
+video_slots = asyncio.Semaphore(MAX_PARALLEL_VIDEOS)
+
+
+# Per-video comment store: re-analysis only fetches and scores new comments.
+# Set COMMENT_STORE_PATH to an empty string to always fetch everything.
+COMMENT_STORE_PATH = os.getenv("COMMENT_STORE_PATH", "comment_store.db")
+comment_store = CommentStore(COMMENT_STORE_PATH) if COMMENT_STORE_PATH else None
+
+
+async def load_stored_video(video_url):
+    async with video_slots:
+        with stage("youtube_fetch"):
+            refresh = await run_in_threadpool(refresh_video, get_fetcher(), comment_store, video_url)
+
+    version = prediction_cache.version
+    comment_ids, texts, scores = await run_in_threadpool(comment_store.comments, refresh["video_id"], version)
+
+    # One entry per distinct text, like get_comments() builds
+    occurrences = collections.Counter(texts)
+    text_scores = {}
+    for text, row in zip(texts, scores):
+        if text_scores.get(text) is None:
+            text_scores[text] = row
+    regular_comments = list(text_scores)
+    folding = await fold_comments(regular_comments, [occurrences[text] for text in regular_comments])
+    representatives = folding.representative_texts()
+
+    # Only cluster representatives without scores for the current model
+    # reach the model. Only their own (exact) scores are stored; other
+    # members are folded onto them again on the next request.
+    unscored = [text for text in representatives if text_scores[text] is None]
+    if unscored:
+        fresh = await score_texts(unscored)
+        text_scores.update(zip(unscored, fresh))
+        fresh_texts = set(unscored)
+        missing = [i for i, row in enumerate(scores) if row is None and texts[i] in fresh_texts]
+        await run_in_threadpool(
+            comment_store.save_scores,
+            [comment_ids[i] for i in missing],
+            [text_scores[texts[i]] for i in missing],
+            version,
+        )
+
+    comments_data = {
+        "regular_comments": regular_comments,
+        "total_reported": refresh["total_reported"],
+        "total_fetched": len(regular_comments),
+        "unavailable_count": refresh["total_reported"] - len(regular_comments),
+        "from_store": refresh["from_store"],
+        "fetched_new": refresh["fetched_new"],
+        "scored_new": len(unscored),
+        "dedup": folding.stats(),
+    }
+    representative_scores = np.array([text_scores[text] for text in representatives], dtype=np.float32)
+    predictions = folding.expand(representative_scores.reshape(-1, len(CLASS_NAMES)))
+    return comments_data, predictions
+
+
+async def analyze_video(video_url, response_format="rows"):
+    if comment_store is not None:
+        comments_data, batch_predictions = await load_stored_video(video_url)
+    else:
+        async with video_slots:
+            # Fetch on a worker thread so scoring for other requests keeps flowing
+            with stage("youtube_fetch"):
+                comments_data = await run_in_threadpool(get_comments, video_url)
+    regular_comments = comments_data["regular_comments"]
+
+    # The batcher splits the video into model-sized batches and
+    # shares them with any concurrent /predict/ calls
+    if not regular_comments:
+        batch_predictions = np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+    elif comment_store is None:
+        batch_predictions, comments_data["dedup"] = await fold_and_score(
+            regular_comments, comments_data["occurrences"]
+        )
+    log_predictions(regular_comments, batch_predictions)
+
+    with stage("postprocess"):
+        comments = format_results(regular_comments, batch_predictions, THRESHOLDS, CLASS_NAMES, response_format)
+    return {
+        "video_url": video_url,
+        "stats": {
+            "total_reported": comments_data["total_reported"],
+            "total_fetched": comments_data["total_fetched"],
+            "regular_count": len(regular_comments),
+            "unavailable_count": comments_data["unavailable_count"],
+            # How much came from the comment store vs. fresh from the API
+            **{key: comments_data[key] for key in ("from_store", "fetched_new", "scored_new") if key in comments_data},
+            # Occurrence counts and how many model inputs duplicate folding saved
+            **({"dedup": comments_data["dedup"]} if "dedup" in comments_data else {}),
+        },
+        "comments": comments
+    }
+
 
 @app.post("/analyze-youtube/")
 async def analyze_youtube_comments(request: YouTubeRequest):
     try:
-        all_results = []
-        
-        for video_url in request.links:
-            comments_data = get_comments(video_url)
-            regular_comments = comments_data["regular_comments"]
-            
-            # Process in smaller batches
-            batch_size = 32
-            all_predictions = []
-            all_raw_scores = []
-            
-            for i in range(0, len(regular_comments), batch_size):
-                batch = regular_comments[i:i + batch_size]
-                vectorized = vectorizer(batch).numpy()
-                batch_predictions = model.predict(vectorized, batch_size=batch_size, verbose=0)
-                
-                # Store raw scores
-                all_raw_scores.extend(batch_predictions.tolist())
-                
-                # Apply class-specific thresholds
-                binary_batch = []
-                for pred in batch_predictions:
-                    binary_pred = [(float(pred[i]) > THRESHOLDS[i]) for i in range(len(THRESHOLDS))]
-                    binary_batch.append([int(x) for x in binary_pred])
-                
-                all_predictions.extend(binary_batch)
-            
-            result = {
-                "video_url": video_url,
-                "stats": {
-                    "total_reported": comments_data["total_reported"],
-                    "total_fetched": comments_data["total_fetched"],
-                    "regular_count": len(regular_comments),
-                    "unavailable_count": comments_data["unavailable_count"]
-                },
-                "comments": [
-                    {
-                        "text": comment,
-                        "prediction": pred,
-                        "raw_scores": [float(f'{x:.4f}') for x in raw],
-                        "class_names": CLASS_NAMES
-                    }
-                    for comment, pred, raw in zip(regular_comments, all_predictions, all_raw_scores)
-                ]
-            }
-            all_results.append(result)
-            
-        return {"results": all_results}
-        
+        # Links are fetched and scored in parallel; results keep request order
+        all_results = await asyncio.gather(
+            *(analyze_video(video_url, request.response_format) for video_url in request.links)
+        )
+
+        with stage("serialize"):
+            return JSONResponse({"results": list(all_results)})
+
+    except HttpError as error:
+        # The YouTube API refused or failed: a bad upstream, not a bug here
+        logger.warning("YouTube API error: %s", error)
+        raise HTTPException(status_code=502, detail=f"YouTube API error {error.resp.status}: {error}")
     except Exception as e:
-        print(f"Error occurred: {str(e)}")
+        logger.exception("YouTube analysis failed")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def stream_video(video_url):
+    fetcher = get_fetcher()
+    video_id = parse_video_id(video_url)
+    async with video_slots:
+        total_reported = await run_in_threadpool(fetcher.total_comments, video_id)
+    yield {"type": "video", "video_url": video_url, "total_reported": total_reported}
+
+    pages = fetcher.iter_comment_pages(video_id)
+    # Only hashes of seen texts are kept, so memory is bounded by the couple
+    # of pages in flight rather than the whole comment history
+    seen = set()
+    class_counts = np.zeros(len(CLASS_NAMES), dtype=np.int64)
+    scored = 0
+
+    next_page = asyncio.ensure_future(run_in_threadpool(next, pages, None))
+    try:
+        while True:
+            with stage("youtube_fetch"):
+                page = await next_page
+            if page is None:
+                break
+            # Start fetching the next page before scoring this one
+            next_page = asyncio.ensure_future(run_in_threadpool(next, pages, None))
+
+            texts = []
+            for comment in page:
+                digest = hashlib.blake2b(comment["text"].encode("utf-8"), digest_size=8).digest()
+                if digest not in seen:
+                    seen.add(digest)
+                    texts.append(comment["text"])
+            if not texts:
+                continue
+
+            predictions, _ = await fold_and_score(texts)
+            with stage("postprocess"):
+                comments = row_results(texts, predictions, THRESHOLDS, CLASS_NAMES)
+                class_counts += apply_thresholds(predictions, THRESHOLDS).sum(axis=0)
+            scored += len(texts)
+
+            yield {"type": "comments", "video_url": video_url, "comments": comments}
+            yield {
+                "type": "stats",
+                "video_url": video_url,
+                "scored": scored,
+                "class_counts": dict(zip(CLASS_NAMES, class_counts.tolist())),
+            }
+    finally:
+        next_page.cancel()
+
+    yield {
+        "type": "done",
+        "video_url": video_url,
+        "stats": {
+            "total_reported": total_reported,
+            "total_fetched": scored,
+            "regular_count": scored,
+            "unavailable_count": total_reported - scored,
+            "class_counts": dict(zip(CLASS_NAMES, class_counts.tolist())),
+        },
+    }
+
+
+async def stream_results(links):
+    for video_url in links:
+        try:
+            async for event in stream_video(video_url):
+                with stage("serialize"):
+                    line = json.dumps(event) + "\n"
+                yield line
+        except HttpError as error:
+            yield json.dumps({"type": "error", "video_url": video_url, "detail": str(error)}) + "\n"
+
+
+@app.post("/analyze-youtube/stream/")
+async def analyze_youtube_stream(request: YouTubeRequest):
+    # NDJSON: each page of comments is scored while the next one is fetched,
+    # and per-comment results plus running class counts are sent as they go
+    return StreamingResponse(stream_results(request.links), media_type="application/x-ndjson")
+
+
+# Background jobs: POST /jobs/ returns a job ID at once, and the links are
+# analysed by JOB_WORKERS concurrent jobs in this process. Job state and
+# per-video results live in JOB_STORE_PATH, so they outlive the request and
+# the process; results younger than JOB_RESULT_TTL seconds are reused.
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+# Daily YouTube Data API units to plan jobs against (10000 is the default
+# project quota); 0 schedules without a budget
+YOUTUBE_QUOTA_UNITS = int(os.getenv("YOUTUBE_QUOTA_UNITS", "0"))
+YOUTUBE_QUOTA_WINDOW = float(os.getenv("YOUTUBE_QUOTA_WINDOW", "86400"))
+YOUTUBE_QUOTA_PAUSE = float(os.getenv("YOUTUBE_QUOTA_PAUSE", "900"))
+
+
+def estimate_video_units(video_url):
+    # This videos.list call and the job's own, plus one commentThreads page
+    # per 100 comments not in the comment store. Reply pages are not
+    # known in advance; the budget counts them once they are made.
+    video_id = parse_video_id(video_url)
+    total = get_fetcher().total_comments(video_id)
+    stored = comment_store.count(video_id) if comment_store is not None else 0
+    return 2 + math.ceil(max(total - stored, 0) / 100)
+
+
+job_queue = JobQueue(
+    JobStore(JOB_STORE_PATH),
+    run_video=analyze_video,
+    estimate_video=estimate_video_units,
+    # Stored results are only reused while scores and labels would match
+    result_version=f"{prediction_cache.version}:thresholds={THRESHOLDS}:near_duplicates={NEAR_DUPLICATE_THRESHOLD}",
+    workers=JOB_WORKERS,
+    quota=QuotaBudget(YOUTUBE_QUOTA_UNITS, YOUTUBE_QUOTA_WINDOW, YOUTUBE_QUOTA_PAUSE),
+    result_ttl=JOB_RESULT_TTL,
+)
+
+REGISTRY.gauge("toxicity_jobs_queued", "Background jobs waiting to run", lambda: job_queue.count("queued"))
+REGISTRY.gauge("toxicity_jobs_running", "Background jobs running", lambda: job_queue.count("running"))
+
+
+class JobRequest(YouTubeRequest):
+    # Analyse again even if a stored result is still fresh
+    refresh: bool = False
+
+
+@app.post("/jobs/")
+async def submit_job(request: JobRequest):
+    if not request.links:
+        raise HTTPException(status_code=400, detail="No links provided")
+    job = await job_queue.submit(request.links, request.response_format, request.refresh)
+    # 200 when every link was answered from stored results
+    return JSONResponse(job, status_code=202 if job["status"] == "queued" else 200)
+
+
+@app.get("/jobs/")
+async def job_queue_summary():
+    return job_queue.summary()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    try:
+        return JSONResponse(await job_queue.status(job_id))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+@app.get("/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    # Results of the videos finished so far, in link order
+    try:
+        results = await job_queue.results(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    with stage("serialize"):
+        return JSONResponse(results)
+
+
+async def stream_job_events(job_id):
+    async for event in job_queue.events(job_id):
+        with stage("serialize"):
+            line = json.dumps(event) + "\n"
+        yield line
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # NDJSON: a status line on every change and a video line per finished
+    # video, until the job is done. Reconnecting replays finished videos.
+    try:
+        await job_queue.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(stream_job_events(job_id), media_type="application/x-ndjson")
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class InferenceBatcher:
+    """Collects concurrent scoring calls into shared model batches.
+
+    Callers ``await submit(texts)`` and get back their own rows of the
+    prediction matrix. A single background task drains the queue, merging
+    requests until ``max_batch_size`` texts are pending or ``max_wait_ms``
+    has passed since the first one arrived, and runs ``predict_fn`` on a
+    dedicated thread so the event loop never blocks on the model.
+
+    ``max_in_flight`` batches may run at once, for a ``predict_fn`` backed
+    by several inference processes; the default of one keeps batches
+    strictly sequential.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5, max_in_flight=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._running = set()
+        # One thread by default: Keras models are not safe to call
+        # concurrently and the op-level thread pools already use the cores.
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="inference")
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def in_flight(self):
+        return len(self._running)
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for task in list(self._running):
+            task.cancel()
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, texts):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self._worker is None:
+            await self.start()
+
+        # Requests larger than one batch are split so they can't starve
+        # small callers queued behind them.
+        loop = asyncio.get_running_loop()
+        futures = []
+        for i in range(0, len(texts), self.max_batch_size):
+            future = loop.create_future()
+            await self._queue.put((list(texts[i:i + self.max_batch_size]), future))
+            futures.append(future)
+
+        parts = await asyncio.gather(*futures)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            # Collect only once a slot is free, so batches keep filling
+            # while the model is busy instead of queueing up half-empty
+            await self._slots.acquire()
+            pending = [carry] if carry else [await self._queue.get()]
+            carry = None
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(item[0]) > self.max_batch_size:
+                    carry = item
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            # Skip callers that went away while queued
+            pending = [(texts, future) for texts, future in pending if not future.cancelled()]
+            if not pending:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._dispatch(loop, pending))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, loop, pending):
+        try:
+            batch = [text for texts, _ in pending for text in texts]
+            try:
+                predictions = await loop.run_in_executor(self._executor, self.predict_fn, batch)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            offset = 0
+            for texts, future in pending:
+                if not future.done():
+                    future.set_result(predictions[offset:offset + len(texts)])
+                offset += len(texts)
+        finally:
+            self._slots.release()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so every measurement is a true cold start
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from model_loader import ModelArtifacts, max_rss_mb
+bundle_path = sys.argv[1]
+artifacts = ModelArtifacts(bundle_path=bundle_path)
+artifacts.ensure_loaded()
+status = artifacts.status()
+status["total_seconds"] = time.perf_counter() - start
+print(json.dumps(status))
+"""
+
+
+def measure(bundle_path, repeats):
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE, bundle_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return runs
+
+
+def main():
+    # Cold-start time and peak memory: legacy vectorizer.pkl + toxicity.h5
+    # against the bundle from model_core/model_bundle.py
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bundle", default="toxicity_bundle")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = {"legacy": "__no_bundle__", "bundle": args.bundle}
+    print(f"{'source':<8}{'load s':>9}{'warm-up s':>11}{'total s':>9}{'max RSS MB':>12}")
+    for name, bundle_path in cases.items():
+        runs = measure(bundle_path, args.repeats)
+        best = min(runs, key=lambda run: run["total_seconds"])
+        if best["source"] != name:
+            print(f"{name:<8} skipped: {args.bundle} not found")
+            continue
+        print(f"{name:<8}{best['load_seconds']:>9.2f}{best['warmup_seconds']:>11.2f}"
+              f"{best['total_seconds']:>9.2f}{best['max_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Load test for /predict/ and /analyze-youtube/, fully offline.
+
+Starts the fake YouTube API (fake_youtube_api.py) in this process and the
+FastAPI app under uvicorn in a subprocess pointed at it, then replays a
+weighted mix of requests at each concurrency level::
+
+    python bench_load.py --concurrency 1,8,32 --requests 300
+    python bench_load.py --mix predict_small=1 --server-env INFERENCE_WORKERS=4
+    python bench_load.py --compare bench_results/<earlier run>.json
+
+Every run is written to bench_results/ as JSON (with the git commit), so
+runs from different commits can be compared with --compare. By default
+the server runs without the prediction cache and the comment store so
+that every request does the full fetch + score work.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from fake_youtube_api import WORDS, FakeYouTubeAPI, start_server
+
+SCENARIOS = ("predict_small", "predict_large", "youtube")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree_rss_mb(pid):
+    # Resident memory of the server and its children (inference workers);
+    # None where /proc is unavailable
+    total, stack = 0, [pid]
+    try:
+        while stack:
+            current = stack.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(child) for child in f.read().split())
+    except OSError:
+        return None
+    return total / 1024
+
+
+class MemorySampler:
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = process_tree_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {"mean_mb": round(float(np.mean(self.samples)), 1), "peak_mb": round(max(self.samples), 1)}
+
+
+def post_json(url, body, timeout):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class LoadClient:
+    def __init__(self, base_url, small_size, large_size, timeout, seed):
+        self.base_url = base_url
+        self.small_size = small_size
+        self.large_size = large_size
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _next_id(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _texts(self, count):
+        # A unique tag per text keeps repeats from being served from caches
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        request_id = self._next_id()
+        return [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 60))) + f" r{request_id}x{i}"
+            for i in range(count)
+        ]
+
+    def run(self, scenario):
+        """Send one request; returns ``(seconds, comments, error)``."""
+        if scenario == "youtube":
+            url = f"{self.base_url}/analyze-youtube/"
+            body = {"links": [f"https://www.youtube.com/watch?v=bench{self._next_id()}"]}
+        else:
+            url = f"{self.base_url}/predict/"
+            body = {"texts": self._texts(self.small_size if scenario == "predict_small" else self.large_size)}
+
+        start = time.perf_counter()
+        try:
+            result = post_json(url, body, self.timeout)
+        except (urllib.error.URLError, OSError) as e:
+            return time.perf_counter() - start, 0, str(e)
+        seconds = time.perf_counter() - start
+        if scenario == "youtube":
+            comments = sum(video["stats"]["regular_count"] for video in result["results"])
+        else:
+            comments = len(body["texts"])
+        return seconds, comments, None
+
+
+def percentiles_ms(seconds):
+    if not seconds:
+        return None
+    values = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50": round(float(values[0]), 1), "p95": round(float(values[1]), 1), "p99": round(float(values[2]), 1)}
+
+
+def run_level(client, mix, concurrency, requests, server_pid, seed):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    plan = rng.choices(names, weights=weights, k=requests)
+
+    with MemorySampler(server_pid) as memory, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        outcomes = list(pool.map(client.run, plan))
+        wall = time.perf_counter() - start
+
+    by_scenario = {}
+    for scenario, (seconds, comments, error) in zip(plan, outcomes):
+        entry = by_scenario.setdefault(scenario, {"seconds": [], "comments": 0, "errors": 0})
+        if error:
+            entry["errors"] += 1
+        else:
+            entry["seconds"].append(seconds)
+            entry["comments"] += comments
+
+    all_seconds = [s for entry in by_scenario.values() for s in entry["seconds"]]
+    total_comments = sum(entry["comments"] for entry in by_scenario.values())
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "wall_seconds": round(wall, 2),
+        "requests_per_second": round(len(all_seconds) / wall, 2),
+        "comments_per_second": round(total_comments / wall, 1),
+        "errors": sum(entry["errors"] for entry in by_scenario.values()),
+        "latency_ms": percentiles_ms(all_seconds),
+        "memory": memory.summary(),
+        "scenarios": {
+            scenario: {
+                "requests": len(entry["seconds"]) + entry["errors"],
+                "errors": entry["errors"],
+                "comments": entry["comments"],
+                "latency_ms": percentiles_ms(entry["seconds"]),
+            }
+            for scenario, entry in sorted(by_scenario.items())
+        },
+    }
+
+
+def wait_until_ready(base_url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=5) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            # 503 while loading; give up early if loading failed
+            status = json.loads(e.read() or b"{}")
+            if status.get("status") == "failed":
+                raise RuntimeError(f"Model loading failed: {status.get('error')}")
+            time.sleep(0.5)
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; expected one of {SCENARIOS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_level(level, baseline=None):
+    latency = level["latency_ms"] or {}
+    memory = level["memory"] or {}
+    line = (f"{level['concurrency']:>5}{level['requests_per_second']:>9.1f}{level['comments_per_second']:>11.1f}"
+            f"{latency.get('p50', 0):>9.1f}{latency.get('p95', 0):>9.1f}{latency.get('p99', 0):>9.1f}"
+            f"{memory.get('peak_mb', 0):>10.1f}{level['errors']:>7}")
+    if baseline:
+        change = level["comments_per_second"] / baseline["comments_per_second"] - 1 if baseline["comments_per_second"] else 0
+        line += f"   comments/s {change:+.1%} vs baseline"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("predict_small=6,predict_large=3,youtube=1"),
+                        help="weighted scenarios, e.g. predict_small=6,predict_large=3,youtube=1")
+    parser.add_argument("--small-size", type=int, default=1, help="texts per predict_small request")
+    parser.add_argument("--large-size", type=int, default=256, help="texts per predict_large request")
+    parser.add_argument("--video-threads", type=int, default=300, help="top-level comments per fake video")
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--api-latency-ms", type=float, default=20, help="simulated YouTube API latency per call")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra server environment, e.g. INFERENCE_WORKERS=4 (repeatable)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="default: bench_results/<time>-<commit>.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    api = FakeYouTubeAPI(threads=args.video_threads, reply_ratio=args.reply_ratio, latency_ms=args.api_latency_ms,
+                         seed=args.seed)
+    api_server, endpoint = start_server(api)
+
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "YOUTUBE_API_KEY": "offline",
+        "YOUTUBE_API_ENDPOINT": endpoint,
+        "PREDICTION_CACHE_SIZE": "0",
+        "COMMENT_STORE_PATH": "",
+    })
+    env.update(dict(item.split("=", 1) for item in args.server_env))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        health = wait_until_ready(base_url, server, args.startup_timeout)
+        client = LoadClient(base_url, args.small_size, args.large_size, args.request_timeout, args.seed)
+        # One untimed request per scenario so lazy paths are warm
+        for scenario in args.mix:
+            client.run(scenario)
+
+        baseline = {}
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+
+        print(f"{'conc':>5}{'req/s':>9}{'comments/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MB':>10}{'errors':>7}")
+        levels = []
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            level = run_level(client, args.mix, concurrency, args.requests, server.pid, args.seed + concurrency)
+            levels.append(level)
+            print_level(level, baseline.get(concurrency))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        api_server.shutdown()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "mix": args.mix,
+            "small_size": args.small_size,
+            "large_size": args.large_size,
+            "video_threads": args.video_threads,
+            "reply_ratio": args.reply_ratio,
+            "api_latency_ms": args.api_latency_ms,
+            "server_env": args.server_env,
+            "cpu_count": os.cpu_count(),
+        },
+        "server": health,
+        "youtube_api_calls": api.calls,
+        "levels": levels,
+    }
+    output = args.output or os.path.join(
+        "bench_results", f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    main()
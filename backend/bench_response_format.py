@@ -0,0 +1,68 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from postprocess import format_results
+
+THRESHOLDS = [0.5, 0.4, 0.5, 0.3, 0.5, 0.4]
+CLASS_NAMES = ['toxic', 'severe_toxic', 'obscene', 'threat', 'insult', 'identity_hate']
+
+
+def legacy_rows(texts, predictions):
+    # The per-row, per-class formatting the endpoints used before postprocess.py
+    binary_predictions = []
+    for pred in predictions:
+        binary_pred = [(float(pred[i]) > THRESHOLDS[i]) for i in range(len(THRESHOLDS))]
+        binary_predictions.append([int(x) for x in binary_pred])
+    return [
+        {
+            "text": text,
+            "prediction": pred,
+            "raw_scores": [float(f'{x:.4f}') for x in raw_pred],
+            "class_names": CLASS_NAMES
+        }
+        for text, pred, raw_pred in zip(texts, binary_predictions, predictions)
+    ]
+
+
+def measure(build, repeats):
+    best_build = best_dump = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = build()
+        built = time.perf_counter()
+        body = json.dumps(payload).encode('utf-8')
+        best_build = min(best_build, built - start)
+        best_dump = min(best_dump, time.perf_counter() - built)
+    return best_build, best_dump, len(body)
+
+
+def main():
+    # Post-processing time, serialization time and payload size per format
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = [f"comment number {i} with some words" for i in range(args.comments)]
+    predictions = rng.random((args.comments, len(CLASS_NAMES)), dtype=np.float32)
+
+    cases = {
+        "legacy rows": lambda: legacy_rows(texts, predictions),
+        "rows": lambda: format_results(texts, predictions, THRESHOLDS, CLASS_NAMES, "rows"),
+        "columnar": lambda: format_results(texts, predictions, THRESHOLDS, CLASS_NAMES, "columnar"),
+        "columnar_f16": lambda: format_results(texts, predictions, THRESHOLDS, CLASS_NAMES, "columnar_f16"),
+    }
+
+    print(f"{args.comments} comments, best of {args.repeats}")
+    print(f"{'format':<14}{'postprocess ms':>16}{'json ms':>10}{'bytes':>12}{'bytes/comment':>15}")
+    for name, build in cases.items():
+        build_time, dump_time, size = measure(build, args.repeats)
+        print(f"{name:<14}{build_time * 1000:>16.1f}{dump_time * 1000:>10.1f}{size:>12}{size / args.comments:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_loader import ModelArtifacts
+
+
+def per_comment_us(tokenize, texts, batch_size, repeats):
+    # Best of ``repeats`` passes over ``texts`` in batches of ``batch_size``
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for first in range(0, len(texts), batch_size):
+            tokenize(texts[first:first + batch_size])
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def threaded_per_comment_us(tokenize, texts, batch_size, threads):
+    batches = [texts[first:first + batch_size] for first in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(tokenize, batches[:threads]))
+        start = time.perf_counter()
+        list(pool.map(tokenize, batches))
+        return (time.perf_counter() - start) / len(texts) * 1e6
+
+
+def main():
+    # Per-comment tokenization latency, TextVectorization vs NumpyVectorizer,
+    # at the batch sizes requests and the batcher actually produce
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default='../model_core/jigsaw-toxic-comment-classification-challenge/train.csv/train.csv')
+    parser.add_argument('--bundle', default='toxicity_bundle')
+    parser.add_argument('--vectorizer', default='vectorizer.pkl')
+    parser.add_argument('--comments', type=int, default=4096)
+    parser.add_argument('--batch-sizes', default='1,16,64,256,1024')
+    parser.add_argument('--threads', type=int, default=4, help="threads for the concurrent NumPy run")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if os.path.exists(args.data):
+        texts = pd.read_csv(args.data, usecols=['comment_text'], encoding='utf-8')['comment_text']
+        texts = texts.sample(n=min(args.comments, len(texts)), random_state=0).fillna('').astype(str).tolist()
+        source = "Jigsaw sample"
+    else:
+        rng = np.random.default_rng(0)
+        words = ["you", "are", "a", "great", "idiot", "thanks", "for", "the", "edit", "Wikipedia", "page", "talk"]
+        texts = [" ".join(rng.choice(words, rng.integers(5, 120))) + "!" for _ in range(args.comments)]
+        source = f"synthetic ({args.data} not found)"
+
+    tokenizers = {}
+    for name in ('tf', 'numpy'):
+        start = time.perf_counter()
+        artifacts = ModelArtifacts(bundle_path=args.bundle, vectorizer_path=args.vectorizer,
+                                   load_model=False, tokenizer=name)
+        artifacts.ensure_loaded()
+        # Warm up so TF's first-call tracing is not counted
+        artifacts.tokenize(texts[:64])
+        tokenizers[name] = artifacts.tokenize
+        print(f"{name:<6} loaded in {time.perf_counter() - start:.2f}s")
+
+    lengths = [len(text.split()) for text in texts]
+    print(f"\n{len(texts)} comments ({source}), median {int(np.median(lengths))} words, best of {args.repeats}")
+    print(f"{'batch':>6}{'tf us/comment':>16}{'numpy us/comment':>19}{'speedup':>10}")
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        tf_us = per_comment_us(tokenizers['tf'], texts, batch_size, args.repeats)
+        numpy_us = per_comment_us(tokenizers['numpy'], texts, batch_size, args.repeats)
+        print(f"{batch_size:>6}{tf_us:>16.1f}{numpy_us:>19.1f}{tf_us / numpy_us:>9.1f}x")
+
+    # Pure Python holds the GIL, so this shows it runs off the event loop
+    # thread without TF, not that it scales with threads
+    batch_size = 64
+    threaded = threaded_per_comment_us(tokenizers['numpy'], texts, batch_size, args.threads)
+    print(f"\nnumpy, {args.threads} threads, batch {batch_size}: {threaded:.1f} us/comment")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_loader import ModelArtifacts
+
+# Texts where a byte-level reimplementation could drift from TF: non-ASCII
+# case and whitespace, punctuation-only and empty texts, truncation
+EDGE_CASES = [
+    "",
+    "   ",
+    "...!!!???",
+    "Don't STOP, you're (not) done-ish.",
+    "\u00c9COLE \u00c9cole \u00e9cole",
+    "\u0130STANBUL \u0131stanbul \u01c5 \u03a3\u038a\u03a3\u03a5\u03a6\u039f\u03a3 STRASSE stra\u00dfe",
+    "non\u00a0breaking em\u2003and ideographic\u3000spaces",
+    "tabs\tand\nnew\r\nlines\x0bvertical\x0cform feed",
+    "line\u2028and paragraph\u2029separators\x85next line",
+    "zero\u200bwidth joiner\u200d and e\u0301 combining",
+    "emoji \U0001f600\U0001f621 \U0001f92c!! \u2764\ufe0f\u200d\U0001f525",
+    "\uff26\uff35\uff2c\uff2c \uff57\uff49\uff44\uff54\uff48\uff0c\uff50\uff55\uff4e\uff43\uff54\uff01",
+    "snake_case kebab-case dotted.name http://example.com/a?b=c",
+    "[UNK] <pad> [MASK]",
+    "\x00nul\x00bytes\x00",
+    "a" * 5000,
+    "word " * 2500,
+]
+
+
+def main():
+    # Compares NumpyVectorizer with the TextVectorization layer on the
+    # whole Jigsaw corpus plus EDGE_CASES. Exits non-zero on any mismatch,
+    # so TOKENIZER=numpy is only trusted for a vectorizer that passes.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default='../model_core/jigsaw-toxic-comment-classification-challenge/train.csv/train.csv')
+    parser.add_argument('--bundle', default='toxicity_bundle')
+    parser.add_argument('--vectorizer', default='vectorizer.pkl')
+    parser.add_argument('--samples', type=int, default=0, help="random comments to check; default all")
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--show', type=int, default=5, help="mismatches to print")
+    args = parser.parse_args()
+
+    loaded = {}
+    for tokenizer in ('tf', 'numpy'):
+        artifacts = ModelArtifacts(bundle_path=args.bundle, vectorizer_path=args.vectorizer,
+                                   load_model=False, tokenizer=tokenizer)
+        artifacts.ensure_loaded()
+        loaded[tokenizer] = artifacts
+    vocab = loaded['tf'].vectorizer.get_vocabulary()
+    print(f"Vectorizer: {loaded['tf'].source}, {len(vocab)} tokens, "
+          f"sequence length {loaded['tf'].sequence_length}")
+
+    texts = pd.read_csv(args.data, usecols=['comment_text'], encoding='utf-8')['comment_text']
+    if args.samples:
+        texts = texts.sample(n=min(args.samples, len(texts)), random_state=0)
+    texts = EDGE_CASES + texts.fillna('').astype(str).tolist()
+
+    mismatches = []
+    tokens_checked = 0
+    start = time.perf_counter()
+    for first in range(0, len(texts), args.batch_size):
+        batch = texts[first:first + args.batch_size]
+        expected = loaded['tf'].tokenize(batch)
+        actual = loaded['numpy'].tokenize(batch)
+        if expected.shape != actual.shape:
+            print(f"FAIL: shape {actual.shape} != TF shape {expected.shape}")
+            sys.exit(1)
+        tokens_checked += int((expected != 0).sum())
+        for row in np.flatnonzero((expected != actual).any(axis=1)):
+            mismatches.append((first + row, expected[row], actual[row]))
+    elapsed = time.perf_counter() - start
+
+    print(f"Checked {len(texts)} texts ({len(EDGE_CASES)} edge cases), {tokens_checked} tokens in {elapsed:.1f}s")
+    for index, expected, actual in mismatches[:args.show]:
+        position = int(np.flatnonzero(expected != actual)[0])
+        window = slice(max(position - 2, 0), position + 3)
+        print(f"\nText {index}: {texts[index][:200]!r}")
+        print(f"  first difference at token {position}")
+        print(f"  tf:    {[vocab[i] for i in expected[window]]}")
+        print(f"  numpy: {[vocab[i] for i in actual[window]]}")
+
+    if mismatches:
+        print(f"\nFAIL: {len(mismatches)} of {len(texts)} texts tokenize differently, keep TOKENIZER=tf")
+        sys.exit(1)
+    print("OK: identical tokens for every text")
+
+
+if __name__ == "__main__":
+    main()
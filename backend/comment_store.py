@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from comments_scrapper import parse_video_id
+
+
+class CommentStore:
+    """SQLite store of each video's comments, scores and newest-seen timestamp.
+
+    Re-analysing a video only fetches comments newer than the stored
+    watermark, and only comments without scores for the current model
+    version are sent to the model.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                "video_id TEXT PRIMARY KEY, newest_published_at TEXT, "
+                "total_reported INTEGER, updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS comments ("
+                "comment_id TEXT PRIMARY KEY, video_id TEXT NOT NULL, parent_id TEXT, "
+                "text TEXT NOT NULL, published_at TEXT, model_version TEXT, scores BLOB)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS comments_by_video ON comments (video_id)")
+
+    def newest_published_at(self, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_published_at FROM videos WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def count(self, video_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM comments WHERE video_id = ?", (video_id,)
+            ).fetchone()[0]
+
+    def add_comments(self, video_id, comments, total_reported):
+        """Insert fetched comments; returns how many were not already stored."""
+        # Watermark for the next refresh: newest top-level comment seen
+        newest = max(
+            (c["published_at"] for c in comments if c["parent_id"] is None and c["published_at"]),
+            default=None,
+        )
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO comments (comment_id, video_id, parent_id, text, published_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(c["id"], video_id, c["parent_id"], c["text"], c["published_at"]) for c in comments],
+            )
+            added = self._conn.total_changes - before
+            self._conn.execute(
+                "INSERT INTO videos (video_id, newest_published_at, total_reported, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(video_id) DO UPDATE SET "
+                "newest_published_at = NULLIF(MAX(COALESCE(newest_published_at, ''), "
+                "COALESCE(excluded.newest_published_at, '')), ''), "
+                "total_reported = excluded.total_reported, updated_at = excluded.updated_at",
+                (video_id, newest, total_reported, time.time()),
+            )
+        return added
+
+    def comments(self, video_id, model_version):
+        """Return ``(comment_ids, texts, scores)`` for a video, newest first.
+
+        ``scores`` holds a float32 vector per comment, or ``None`` when the
+        comment has not been scored by ``model_version`` yet.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT comment_id, text, model_version, scores FROM comments "
+                "WHERE video_id = ? ORDER BY published_at DESC",
+                (video_id,),
+            ).fetchall()
+        comment_ids = [row[0] for row in rows]
+        texts = [row[1] for row in rows]
+        scores = [
+            np.frombuffer(blob, dtype=np.float32) if version == model_version and blob is not None else None
+            for _, _, version, blob in rows
+        ]
+        return comment_ids, texts, scores
+
+    def save_scores(self, comment_ids, scores, model_version):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE comments SET model_version = ?, scores = ? WHERE comment_id = ?",
+                [
+                    (model_version, np.asarray(row, dtype=np.float32).tobytes(), comment_id)
+                    for comment_id, row in zip(comment_ids, scores)
+                ],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+def refresh_video(fetcher, store, video_url, part="snippet"):
+    """Fetch only comments newer than the stored watermark into ``store``.
+
+    New replies to threads older than the watermark are not picked up, since
+    ``commentThreads`` ordering is by the top-level comment's publish time.
+    """
+    video_id = parse_video_id(video_url)
+    total_reported = fetcher.total_comments(video_id)
+    since = store.newest_published_at(video_id)
+    from_store = store.count(video_id)
+
+    fetched = []
+    for page in fetcher.iter_comment_pages(video_id, part, since=since):
+        fetched.extend(page)
+    fetched_new = store.add_comments(video_id, fetched, total_reported)
+
+    return {
+        "video_id": video_id,
+        "total_reported": total_reported,
+        "from_store": from_store,
+        "fetched_new": fetched_new,
+    }
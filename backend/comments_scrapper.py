@@ -1,18 +1,33 @@
-import os 
+import collections
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
+from metrics import YOUTUBE_CALLS, YOUTUBE_ERRORS, YOUTUBE_QUOTA_ERRORS, stage, trace_count
 
 load_dotenv()
 DEVELOPER_KEY = os.getenv("YOUTUBE_API_KEY")
+# Base URL override, e.g. http://127.0.0.1:8081/youtube/v3/ for the local
+# stand-in in fake_youtube_api.py
+API_ENDPOINT = os.getenv("YOUTUBE_API_ENDPOINT")
+REPLY_WORKERS = int(os.getenv("YOUTUBE_REPLY_WORKERS", "8"))
+MAX_RETRIES = int(os.getenv("YOUTUBE_MAX_RETRIES", "5"))
 
-def get_comments(video_url, part="snippet"):
-    youtube = build("youtube", "v3", developerKey=DEVELOPER_KEY)
-    
+# 403 reasons that mean "slow down" rather than "you can't do this"
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+def parse_video_id(video_url):
     # Enhanced URL parsing
     parsed_url = urlparse(video_url)
-    
+
     # Handle different URL patterns
     if parsed_url.path == '/watch':
         # Standard watch URL
@@ -26,68 +41,202 @@ def get_comments(video_url, part="snippet"):
     else:
         # Extract from path for other formats
         video_id = parsed_url.path.split('/')[-1]
-    
+
     # Remove any additional parameters from video_id
     video_id = video_id.split('?')[0]
     video_id = video_id.split('&')[0]
-    regular_comments = set()
-    
-    try:
-        video_response = youtube.videos().list(
+    return video_id
+
+
+def is_retryable(error):
+    if error.resp.status in (429, 500, 503):
+        return True
+    if error.resp.status == 403:
+        return any(detail.get("reason") in RETRYABLE_REASONS for detail in (error.error_details or []) if isinstance(detail, dict))
+    return False
+
+
+class YouTubeCommentFetcher:
+    """Fetches comment threads with one API client and concurrent reply paging.
+
+    The discovery document is parsed once. Each worker thread keeps its own
+    keep-alive ``httplib2.Http`` (they are not thread-safe), and reply threads
+    are fetched on a bounded pool while the next ``commentThreads`` page is
+    requested in the background.
+    """
+
+    def __init__(self, developer_key, api_endpoint=None, max_workers=REPLY_WORKERS,
+                 max_retries=MAX_RETRIES, backoff_base=1.0, timeout=30):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self._local = threading.local()
+        client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        self.youtube = build(
+            "youtube", "v3",
+            developerKey=developer_key,
+            http=self._http(),
+            client_options=client_options,
+            cache_discovery=False,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="youtube")
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = httplib2.Http(timeout=self.timeout)
+        return http
+
+    def _submit(self, fn, *args):
+        # Carry the caller's context (request trace) into the pool thread
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _execute(self, request):
+        # e.g. "youtube.commentThreads.list"
+        method = getattr(request, "methodId", None) or "unknown"
+        for attempt in range(self.max_retries + 1):
+            YOUTUBE_CALLS.labels(method).inc()
+            trace_count("youtube_api_calls")
+            try:
+                with stage("youtube_api"):
+                    return request.execute(http=self._http())
+            except HttpError as error:
+                YOUTUBE_ERRORS.labels(method, str(error.resp.status)).inc()
+                if error.resp.status in (403, 429) and is_retryable(error):
+                    YOUTUBE_QUOTA_ERRORS.inc()
+                    trace_count("youtube_quota_errors")
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                # Exponential backoff with jitter
+                time.sleep(self.backoff_base * (2 ** attempt) * (0.5 + random.random()))
+
+    def total_comments(self, video_id):
+        video_response = self._execute(self.youtube.videos().list(
             part='statistics',
             id=video_id
-        ).execute()
-        
-        total_comments = int(video_response['items'][0]['statistics']['commentCount'])
-        
-        next_page_token = None
+        ))
+        return int(video_response['items'][0]['statistics']['commentCount'])
+
+    def _threads_page(self, video_id, part, page_token):
+        return self._execute(self.youtube.commentThreads().list(
+            part=part,
+            videoId=video_id,
+            textFormat="plainText",
+            maxResults=100,
+            pageToken=page_token,
+            order='time'
+        ))
+
+    def _replies(self, parent_id, part):
+        replies = []
+        replies_token = None
         while True:
-            response = youtube.commentThreads().list(
+            response = self._execute(self.youtube.comments().list(
                 part=part,
-                videoId=video_id,
+                parentId=parent_id,
                 textFormat="plainText",
                 maxResults=100,
-                pageToken=next_page_token,
-                order='time'
-            ).execute()
-            
-            for item in response["items"]:
-                comment_text = item["snippet"]["topLevelComment"]["snippet"]["textDisplay"]
-                regular_comments.add(comment_text)
-                
-                if item["snippet"]["totalReplyCount"] > 0:
-                    replies_token = None
-                    while True:
-                        replies = youtube.comments().list(
-                            part=part,
-                            parentId=item["id"],
-                            textFormat="plainText",
-                            maxResults=100,
-                            pageToken=replies_token
-                        ).execute()
-                        
-                        for reply in replies["items"]:
-                            reply_text = reply["snippet"]["textDisplay"]
-                            regular_comments.add(reply_text)
-                            
-                        if 'nextPageToken' not in replies:
-                            break
-                        replies_token = replies['nextPageToken']
-            
+                pageToken=replies_token
+            ))
+            replies.extend(_comment(reply, parent_id) for reply in response["items"])
             if 'nextPageToken' not in response:
-                break
-                
-            next_page_token = response['nextPageToken']
-        
-        unavailable_count = total_comments - len(regular_comments)
-        
+                return replies
+            replies_token = response['nextPageToken']
+
+    def iter_comment_pages(self, video_id, part="snippet", since=None):
+        """Yield one list of comments per ``commentThreads`` page, replies included.
+
+        Each comment is a dict with ``id``, ``text``, ``published_at`` and
+        ``parent_id`` (``None`` for top-level comments). With ``since`` (an
+        RFC 3339 timestamp), paging stops at the first thread published
+        before it; threads come newest first because of ``order='time'``.
+        """
+        # Ask for inline replies too: threads whose replies all fit inline
+        # need no extra comments().list round-trips
+        thread_part = part if "replies" in part else f"{part},replies"
+        pending_page = self._submit(self._threads_page, video_id, thread_part, None)
+
+        while pending_page is not None:
+            response = pending_page.result()
+            pending_page = None
+
+            items = response["items"]
+            if since is not None:
+                items = [
+                    item for item in items
+                    if item["snippet"]["topLevelComment"]["snippet"]["publishedAt"] >= since
+                ]
+            if 'nextPageToken' in response and len(items) == len(response["items"]):
+                pending_page = self._submit(
+                    self._threads_page, video_id, thread_part, response['nextPageToken']
+                )
+
+            page = []
+            reply_jobs = []
+            for item in items:
+                page.append(_comment(item["snippet"]["topLevelComment"]))
+                inline = item.get("replies", {}).get("comments", [])
+                if item["snippet"]["totalReplyCount"] > len(inline):
+                    reply_jobs.append(self._submit(self._replies, item["id"], part))
+                else:
+                    page.extend(_comment(reply, item["id"]) for reply in inline)
+
+            for job in reply_jobs:
+                page.extend(job.result())
+            yield page
+
+    def get_comments(self, video_url, part="snippet"):
+        """Distinct comment texts of a video with their counts; API errors raise ``HttpError``."""
+        video_id = parse_video_id(video_url)
+        # Distinct texts, and how often each was posted
+        regular_comments = collections.Counter()
+
+        total_comments = self.total_comments(video_id)
+        for page in self.iter_comment_pages(video_id, part):
+            regular_comments.update(comment["text"] for comment in page)
+
         return {
             "regular_comments": list(regular_comments),
+            "occurrences": list(regular_comments.values()),
             "total_reported": total_comments,
             "total_fetched": len(regular_comments),
-            "unavailable_count": unavailable_count
+            "unavailable_count": total_comments - len(regular_comments),
         }
-        
-    except HttpError as error:
-        print(f"An HTTP error {error.http_status} occurred:\n {error.content}")
-        return None
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def _comment(resource, parent_id=None):
+    snippet = resource["snippet"]
+    return {
+        "id": resource["id"],
+        "text": snippet["textDisplay"],
+        "published_at": snippet.get("publishedAt"),
+        "parent_id": parent_id,
+    }
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    # Shared by every request so the client and connections are reused
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = YouTubeCommentFetcher(DEVELOPER_KEY, api_endpoint=API_ENDPOINT)
+        return _fetcher
+
+
+def close_fetcher():
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+            _fetcher = None
+
+
+def get_comments(video_url, part="snippet"):
+    return get_fetcher().get_comments(video_url, part)
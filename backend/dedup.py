@@ -0,0 +1,205 @@
+import re
+
+import numpy as np
+
+from prediction_cache import normalize_text
+
+# Emoji, symbols and anything else that is neither a word character nor a space
+_NON_WORD = re.compile(r"[^\w ]+")
+_SPACES = re.compile(r" +")
+# Shorter symbol-stripped texts are never merged outright: "" (emoji-only
+# comments) or a single short word says too little about the original
+MIN_STRIPPED_CHARS = 8
+
+
+class Folding:
+    """Texts folded into clusters, one representative scored per cluster.
+
+    ``assignment[i]`` is the cluster of ``texts[i]`` and
+    ``representatives[c]`` the index of the text scored for cluster ``c``.
+    """
+
+    def __init__(self, texts, assignment, representatives, exact_groups, occurrences):
+        self.texts = texts
+        self.assignment = assignment
+        self.representatives = representatives
+        self.exact_groups = exact_groups
+        self.occurrences = occurrences
+
+    def representative_texts(self):
+        return [self.texts[i] for i in self.representatives]
+
+    def expand(self, scores):
+        # Representative scores back to every member, in input order
+        return np.asarray(scores)[self.assignment]
+
+    def stats(self, top=5):
+        # Occurrences weight each text, e.g. by how often a comment was posted
+        weights = np.asarray(self.occurrences, dtype=np.int64)
+        cluster_sizes = np.bincount(self.assignment, weights=weights, minlength=len(self.representatives)).astype(np.int64)
+        largest = np.argsort(-cluster_sizes, kind="stable")[:top]
+        return {
+            "occurrences": int(weights.sum()),
+            "texts": len(self.texts),
+            "exact_groups": self.exact_groups,
+            "clusters": len(self.representatives),
+            "model_inputs_saved": int(weights.sum()) - len(self.representatives),
+            "top_clusters": [
+                {"text": self.texts[self.representatives[c]], "count": int(cluster_sizes[c])}
+                for c in largest if cluster_sizes[c] > 1
+            ],
+        }
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def minhash_signatures(texts, num_perm=64, seed=0, max_block=1 << 18):
+    """MinHash signatures over byte 4-grams of each text.
+
+    Returns an ``(n, num_perm)`` uint32 matrix and a mask of the texts long
+    enough to have a 4-gram (other rows are meaningless). A 4-gram is read
+    as a uint32, mixed once, then hashed per permutation with an odd
+    multiplier and offset that wrap in uint32 (no modulo, half the memory
+    traffic of uint64).
+    """
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(0, 2 ** 31, size=(num_perm, 1), dtype=np.uint32) << np.uint32(1)) | np.uint32(1)
+    b = rng.integers(0, 2 ** 32, size=(num_perm, 1), dtype=np.uint32)
+
+    encoded = [text.encode("utf-8") for text in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    counts = np.maximum(lengths - 3, 0)
+    valid = counts > 0
+    ends = np.cumsum(counts)
+
+    # Start of every 4-gram in ``data``, text by text
+    positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - counts), counts)
+    grams = ((data[positions] << np.uint64(24)) | (data[positions + 1] << np.uint64(16))
+             | (data[positions + 2] << np.uint64(8)) | data[positions + 3]).astype(np.uint32)
+    # murmur3's finalizer, so similar 4-grams land far apart
+    grams ^= grams >> np.uint32(16)
+    grams *= np.uint32(0x85EBCA6B)
+    grams ^= grams >> np.uint32(13)
+    grams *= np.uint32(0xC2B2AE35)
+    grams ^= grams >> np.uint32(16)
+
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint32)
+    valid_rows = np.flatnonzero(valid)
+    segment_starts = (ends - counts)[valid_rows]
+    # Blocks of whole texts, bounded in 4-grams to cap the (num_perm, m) temporary
+    block_edges = np.searchsorted(ends[valid_rows], np.arange(max_block, len(grams), max_block), side="left")
+    for rows in np.split(np.arange(len(valid_rows)), np.unique(block_edges)):
+        if not len(rows):
+            continue
+        first = segment_starts[rows[0]]
+        last = ends[valid_rows[rows[-1]]]
+        hashed = a * grams[first:last] + b
+        signatures[valid_rows[rows]] = np.minimum.reduceat(hashed, segment_starts[rows] - first, axis=1).T
+    return signatures, valid
+
+
+def candidate_pairs(signatures, valid, bands):
+    """``(first, other)`` pairs sharing at least one LSH band, ``first`` being the bucket's earliest row."""
+    rows = signatures.shape[1] // bands
+    # One 64-bit key per band; collisions only cost an extra comparison
+    mixers = np.random.default_rng(1).integers(1, 2 ** 63, size=rows, dtype=np.uint64)
+    banded = signatures[:, :bands * rows].reshape(len(signatures), bands, rows).astype(np.uint64)
+    keys = (banded * mixers).sum(axis=2)
+
+    candidates = np.flatnonzero(valid)
+    pairs = []
+    for band in range(bands):
+        order = candidates[np.argsort(keys[candidates, band], kind="stable")]
+        ordered = keys[order, band]
+        run_start = np.concatenate(([True], ordered[1:] != ordered[:-1]))
+        firsts = order[np.maximum.accumulate(np.where(run_start, np.arange(len(order)), 0))]
+        members = firsts != order
+        pairs.append(np.stack([firsts[members], order[members]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def fold_texts(texts, occurrences=None, threshold=0, num_perm=64, bands=16):
+    """Group exact duplicates (after the vectorizer's normalization) and near-duplicates.
+
+    Exact duplicates tokenize identically, so folding them never changes a
+    score. Near-duplicates are texts that, after dropping emoji and other
+    symbols, have the same set of words and an estimated Jaccard
+    similarity of character 4-grams of at least ``threshold``; MinHash LSH
+    with ``bands`` bands finds the candidates. Requiring the same words
+    keeps an appended insult or a swapped word from inheriting a benign
+    score. Near-duplicates share their representative's score, which is
+    not exact, so ``threshold=0`` (fold exact duplicates only) is the
+    default.
+    """
+    if occurrences is None:
+        occurrences = [1] * len(texts)
+
+    group_of = {}
+    assignment = np.empty(len(texts), dtype=np.int64)
+    group_weights = []
+    group_first = []
+    for i, text in enumerate(texts):
+        key = normalize_text(text)
+        group = group_of.get(key)
+        if group is None:
+            group = group_of[key] = len(group_first)
+            group_first.append(i)
+            group_weights.append(0)
+        assignment[i] = group
+        group_weights[group] += occurrences[i]
+    exact_groups = len(group_first)
+
+    union = _UnionFind(exact_groups)
+    if threshold > 0 and exact_groups > 1:
+        stripped = [_SPACES.sub(" ", _NON_WORD.sub("", key)).strip() for key in group_of]
+        # Groups differing only in emoji or symbols are merged outright,
+        # unless too little text is left to tell them apart
+        first_with = {}
+        for group, text in enumerate(stripped):
+            if len(text) >= MIN_STRIPPED_CHARS:
+                union.union(group, first_with.setdefault(text, group))
+
+        signatures, valid = minhash_signatures(stripped, num_perm=num_perm)
+        pairs = candidate_pairs(signatures, valid, bands)
+        # Estimated Jaccard similarity = share of matching MinHash values
+        similar = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1) >= threshold
+        words = [frozenset(text.split()) for text in stripped]
+        for first, other in pairs[similar].tolist():
+            if words[first] == words[other]:
+                union.union(first, other)
+
+    # Clusters numbered in order of first appearance; the most frequent
+    # member group represents each one
+    cluster_of_root = {}
+    best_group = []
+    group_cluster = np.empty(exact_groups, dtype=np.int64)
+    for group in range(exact_groups):
+        root = union.find(group)
+        cluster = cluster_of_root.get(root)
+        if cluster is None:
+            cluster = cluster_of_root[root] = len(best_group)
+            best_group.append(group)
+        elif group_weights[group] > group_weights[best_group[cluster]]:
+            best_group[cluster] = group
+        group_cluster[group] = cluster
+
+    representatives = [group_first[group] for group in best_group]
+    return Folding(texts, group_cluster[assignment], representatives, exact_groups, occurrences)
@@ -0,0 +1,201 @@
+"""Local stand-in for the YouTube Data API v3 comment endpoints.
+
+Serves ``videos``, ``commentThreads`` and ``comments`` list calls from
+synthetic, deterministic comment trees so the fetcher and the backend can
+run offline. Point the backend at it with::
+
+    python fake_youtube_api.py --port 8081
+    YOUTUBE_API_KEY=offline YOUTUBE_API_ENDPOINT=http://127.0.0.1:8081/youtube/v3/ uvicorn app:app
+
+Any video ID is accepted; its comment tree is derived from the ID.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+WORDS = [
+    "great", "video", "love", "this", "song", "you", "are", "so", "stupid", "idiot",
+    "thanks", "for", "sharing", "who", "is", "watching", "in", "2025", "worst", "ever",
+    "hate", "amazing", "lol", "what", "the", "hell", "subscribe", "my", "channel", "trash",
+]
+SPAM = ["first!", "Check out my channel!!", "who's here after the update?", "lol"]
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CommentTree:
+    """Synthetic comments for one video, newest thread first."""
+
+    def __init__(self, video_id, threads=300, reply_ratio=0.3, max_replies=120, spam_ratio=0.1, seed=0):
+        rng = random.Random(zlib.crc32(video_id.encode()) ^ seed)
+        self.threads = []
+        self.replies = {}
+        for i in range(threads):
+            thread_id = f"{video_id}-t{i}"
+            # Thread 0 is the newest, matching order=time
+            published = (threads - i) * 60
+            self.threads.append({"id": thread_id, "text": self._text(rng, spam_ratio), "published": published})
+            count = 0
+            if rng.random() < reply_ratio:
+                count = min(max_replies, int(rng.expovariate(1 / 8)) + 1)
+            self.replies[thread_id] = [
+                {"id": f"{thread_id}.r{j}", "text": self._text(rng, spam_ratio), "published": published + j + 1}
+                for j in range(count)
+            ]
+
+    @staticmethod
+    def _text(rng, spam_ratio):
+        if rng.random() < spam_ratio:
+            return rng.choice(SPAM)
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 40)))
+
+    @property
+    def total(self):
+        return len(self.threads) + sum(len(r) for r in self.replies.values())
+
+
+def _comment_resource(comment, parent_id=None):
+    snippet = {"textDisplay": comment["text"], "publishedAt": _timestamp(comment["published"])}
+    if parent_id:
+        snippet["parentId"] = parent_id
+    return {"kind": "youtube#comment", "id": comment["id"], "snippet": snippet}
+
+
+class FakeYouTubeAPI:
+    def __init__(self, threads=300, reply_ratio=0.3, max_replies=120, spam_ratio=0.1,
+                 latency_ms=0, error_rate=0.0, seed=0):
+        self.tree_options = dict(threads=threads, reply_ratio=reply_ratio, max_replies=max_replies,
+                                 spam_ratio=spam_ratio, seed=seed)
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.calls = {"videos": 0, "commentThreads": 0, "comments": 0, "errors": 0}
+        self._trees = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def tree(self, video_id):
+        with self._lock:
+            if video_id not in self._trees:
+                self._trees[video_id] = CommentTree(video_id, **self.tree_options)
+            return self._trees[video_id]
+
+    def handle(self, resource, params):
+        """Return ``(status, body)`` for one list call."""
+        with self._lock:
+            self.calls[resource] = self.calls.get(resource, 0) + 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.calls["errors"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 429, {"error": {"code": 429, "message": "Rate limit exceeded",
+                                   "errors": [{"reason": "rateLimitExceeded"}]}}
+
+        page_size = min(int(params.get("maxResults", 20)), 100)
+        offset = int(params.get("pageToken") or 0)
+
+        if resource == "videos":
+            video_id = params["id"]
+            return 200, {"items": [{"id": video_id, "statistics": {"commentCount": str(self.tree(video_id).total)}}]}
+
+        if resource == "commentThreads":
+            tree = self.tree(params["videoId"])
+            items = []
+            for thread in tree.threads[offset:offset + page_size]:
+                replies = tree.replies[thread["id"]]
+                item = {
+                    "kind": "youtube#commentThread",
+                    "id": thread["id"],
+                    "snippet": {
+                        "videoId": params["videoId"],
+                        "topLevelComment": _comment_resource(thread),
+                        "totalReplyCount": len(replies),
+                    },
+                }
+                if "replies" in params.get("part", "") and replies:
+                    # Like the real API, only a few replies are inlined
+                    item["replies"] = {"comments": [_comment_resource(r, thread["id"]) for r in replies[:5]]}
+                items.append(item)
+            return 200, self._page(items, offset, page_size, len(tree.threads))
+
+        if resource == "comments":
+            parent_id = params["parentId"]
+            video_id = parent_id.rsplit("-t", 1)[0]
+            replies = self.tree(video_id).replies.get(parent_id, [])
+            items = [_comment_resource(r, parent_id) for r in replies[offset:offset + page_size]]
+            return 200, self._page(items, offset, page_size, len(replies))
+
+        return 404, {"error": {"code": 404, "message": f"Unknown resource {resource}"}}
+
+    @staticmethod
+    def _page(items, offset, page_size, total):
+        body = {"items": items, "pageInfo": {"totalResults": total, "resultsPerPage": page_size}}
+        if offset + page_size < total:
+            body["nextPageToken"] = str(offset + page_size)
+        return body
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            resource = url.path.rstrip("/").split("/")[-1]
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, body = api.handle(resource, params)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(api, host="127.0.0.1", port=0):
+    """Serve ``api`` on a background thread; returns ``(server, endpoint_url)``."""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/youtube/v3/"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--threads", type=int, default=300, help="top-level comments per video")
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--max-replies", type=int, default=120)
+    parser.add_argument("--spam-ratio", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    args = parser.parse_args()
+
+    api = FakeYouTubeAPI(threads=args.threads, reply_ratio=args.reply_ratio, max_replies=args.max_replies,
+                         spam_ratio=args.spam_ratio, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    print(f"Fake YouTube API on http://{args.host}:{args.port}/youtube/v3/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+
+from postprocess import round_scores
+
+FILE_TYPES = ("txt", "csv")
+# Tried in order when no text column is given
+TEXT_COLUMNS = ("comment_text", "text", "comment")
+
+
+def detect_file_type(filename="", content_type=""):
+    if filename.lower().endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return "txt"
+
+
+class FileRows:
+    """Reads an uploaded .txt or .csv file a chunk of rows at a time.
+
+    ``binary_file`` is any readable binary file object (an upload spooled
+    to disk, for instance); only the current chunk is held in memory. A
+    .txt file has one comment per non-empty line. A .csv file needs a
+    header row, and every column is kept so it can be echoed back.
+    """
+
+    def __init__(self, binary_file, file_type="txt", text_column=None):
+        # utf-8-sig drops the BOM that spreadsheet exports often start with
+        self.stream = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace", newline="")
+        if file_type == "csv":
+            self.reader = csv.reader(self.stream)
+            self.columns = next(self.reader, None)
+            if not self.columns:
+                raise ValueError("CSV file is empty")
+            self.text_index = self._text_index(text_column)
+        else:
+            self.reader = ([line.rstrip("\r\n")] for line in self.stream if line.strip())
+            self.columns = ["text"]
+            self.text_index = 0
+
+    def _text_index(self, text_column):
+        if text_column is not None:
+            if text_column not in self.columns:
+                raise ValueError(f"Column {text_column!r} not found; columns are {self.columns}")
+            return self.columns.index(text_column)
+        for name in TEXT_COLUMNS:
+            if name in self.columns:
+                return self.columns.index(name)
+        return 0
+
+    def read_chunk(self, size):
+        """Up to ``size`` rows as lists of strings, padded to the header width."""
+        rows = []
+        width = len(self.columns)
+        for row in self.reader:
+            if len(row) < width:
+                row = row + [""] * (width - len(row))
+            rows.append(row)
+            if len(rows) == size:
+                break
+        return rows
+
+    def texts(self, rows):
+        return [row[self.text_index] for row in rows]
+
+
+def csv_header(columns, class_names):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(list(columns) + list(class_names))
+    return buffer.getvalue()
+
+
+def csv_chunk(rows, scores):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row, row_scores in zip(rows, round_scores(scores).tolist()):
+        writer.writerow(row + row_scores)
+    return buffer.getvalue()
+
+
+def ndjson_chunk(columns, rows, scores, class_names):
+    lines = []
+    for row, row_scores in zip(rows, round_scores(scores).tolist()):
+        record = dict(zip(columns, row))
+        record["scores"] = dict(zip(class_names, row_scores))
+        lines.append(json.dumps(record))
+    return "\n".join(lines) + "\n"
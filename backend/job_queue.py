@@ -0,0 +1,497 @@
+"""Background jobs for YouTube analyses, with results kept in SQLite.
+
+A job is a list of links. ``JobQueue.submit`` stores it and returns right
+away. A bounded number of jobs then run in this process, one video at a
+time each, and every finished video's result is written to the
+``JobStore``. Progress and results can be polled or streamed while the job
+runs, and they survive a dropped connection or a restart: jobs that were
+queued or running when the process stopped are queued again on start.
+
+Scheduling is small-first and quota-aware. Before a job runs, its YouTube
+Data API cost is estimated (``estimate_video`` per link). Among the queued
+jobs that fit in what is left of the quota, the one with the smallest
+estimate starts first, with the estimate discounted the longer the job has
+waited so large jobs are not starved. A quota error pauses the queue.
+
+Finished per-video results are reused by later jobs for the same video,
+response format and ``result_version`` until they are ``result_ttl``
+seconds old.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from googleapiclient.errors import HttpError
+
+from comments_scrapper import is_retryable, parse_video_id
+from metrics import YOUTUBE_CALLS, end_trace, start_trace
+
+FINISHED = ("done", "failed")
+
+
+def is_quota_error(error):
+    return isinstance(error, HttpError) and error.resp.status in (403, 429) and is_retryable(error)
+
+
+class JobStore:
+    """SQLite tables of jobs and of their per-video results, stored as JSON."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, response_format TEXT NOT NULL, status TEXT NOT NULL, "
+                "created_at REAL, started_at REAL, finished_at REAL, estimated_units INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_videos ("
+                "job_id TEXT NOT NULL, position INTEGER NOT NULL, video_url TEXT NOT NULL, "
+                "video_id TEXT, response_format TEXT NOT NULL, result_version TEXT NOT NULL, "
+                "status TEXT NOT NULL, from_cache INTEGER NOT NULL DEFAULT 0, "
+                "result TEXT, error TEXT, finished_at REAL, PRIMARY KEY (job_id, position))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_video "
+                "ON job_videos (video_id, response_format, result_version, finished_at)"
+            )
+
+    def add_job(self, job, result_version, cached_results):
+        """Insert a new job; ``cached_results`` maps positions to reused result JSON."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, response_format, status, created_at, finished_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job["job_id"], job["response_format"], job["status"], job["created_at"], job["finished_at"]),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_videos (job_id, position, video_url, video_id, response_format, "
+                "result_version, status, from_cache, result, error, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job["job_id"], video["position"], video["video_url"], video["video_id"],
+                     job["response_format"], result_version, video["status"], int(video["from_cache"]),
+                     cached_results.get(video["position"]), video["error"], video["finished_at"])
+                    for video in job["videos"]
+                ],
+            )
+
+    def update_job(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def finish_video(self, job_id, video, result=None):
+        # Serialized here, on the caller's worker thread: results can be large
+        result_json = json.dumps(result) if result is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE job_videos SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE job_id = ? AND position = ?",
+                (video["status"], result_json, video["error"], video["finished_at"], job_id, video["position"]),
+            )
+
+    def cached_result(self, video_id, response_format, result_version, newer_than):
+        """Newest finished ``(result_json, finished_at)`` for a video, or ``None``."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT result, finished_at FROM job_videos WHERE video_id = ? AND response_format = ? "
+                "AND result_version = ? AND status = 'done' AND finished_at >= ? "
+                "ORDER BY finished_at DESC LIMIT 1",
+                (video_id, response_format, result_version, newer_than),
+            ).fetchone()
+
+    def job(self, job_id):
+        """The job and its videos (without results) as dicts, or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, response_format, status, created_at, started_at, finished_at, "
+                "estimated_units FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            videos = self._conn.execute(
+                "SELECT position, video_url, video_id, status, from_cache, error, finished_at "
+                "FROM job_videos WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        job = dict(zip(
+            ("job_id", "response_format", "status", "created_at", "started_at", "finished_at", "estimated_units"),
+            row,
+        ))
+        job["videos"] = [
+            dict(zip(("position", "video_url", "video_id", "status", "from_cache", "error", "finished_at"), video))
+            for video in videos
+        ]
+        for video in job["videos"]:
+            video["from_cache"] = bool(video["from_cache"])
+        return job
+
+    def video_result(self, job_id, position):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM job_videos WHERE job_id = ? AND position = ?", (job_id, position)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status NOT IN ('done', 'failed') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+class QuotaBudget:
+    """YouTube Data API units left in the current quota window.
+
+    Spending is read from the API call counter, so calls made outside jobs
+    (``/analyze-youtube/``, streams) count too; each call is taken to cost
+    one unit, which holds for the list methods used here. ``units=0``
+    enforces no budget, but quota errors still pause the queue.
+    """
+
+    def __init__(self, units=0, window_seconds=86400, pause_seconds=900, used=YOUTUBE_CALLS.total):
+        self.units = units
+        self.window_seconds = window_seconds
+        self.pause_seconds = pause_seconds
+        self._used = used
+        self._window_end = 0.0
+        self._baseline = 0
+        self._paused_until = 0.0
+
+    def _roll(self):
+        now = time.time()
+        if now >= self._window_end:
+            self._window_end = now + self.window_seconds
+            self._baseline = self._used()
+
+    def remaining(self):
+        if not self.units:
+            return float("inf")
+        self._roll()
+        return max(self.units - (self._used() - self._baseline), 0)
+
+    def paused_for(self):
+        return max(self._paused_until - time.time(), 0.0)
+
+    def pause(self):
+        self._paused_until = time.time() + self.pause_seconds
+
+    def status(self):
+        remaining = self.remaining()
+        return {
+            "units": self.units or None,
+            "remaining": None if remaining == float("inf") else remaining,
+            "window_resets_in": round(self._window_end - time.time(), 1) if self.units else None,
+            "paused_for": round(self.paused_for(), 1),
+        }
+
+
+class JobQueue:
+    """Runs submitted jobs on ``workers`` concurrent tasks in this event loop.
+
+    ``run_video(video_url, response_format)`` is awaited for each video and
+    returns its JSON-serializable result. ``estimate_video(video_url)`` is a
+    blocking call, run on a worker thread, that returns the API units
+    analysing the video is expected to cost.
+    """
+
+    def __init__(self, store, run_video, estimate_video, result_version, workers=2,
+                 quota=None, result_ttl=3600, aging_seconds=300, poll_seconds=5):
+        self.store = store
+        self.run_video = run_video
+        self.estimate_video = estimate_video
+        self.result_version = result_version
+        self.workers = workers
+        self.quota = quota or QuotaBudget()
+        self.result_ttl = result_ttl
+        self.aging_seconds = aging_seconds
+        self.poll_seconds = poll_seconds
+        # Queued and running jobs; finished ones are only in the store
+        self._jobs = {}
+        self._traces = {}
+        self._estimating = set()
+        self._tasks = set()
+        self._dispatcher = None
+        self._changed = asyncio.Event()
+
+    def count(self, status):
+        return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    def _notify(self):
+        # Wakes the dispatcher and every event stream
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait_for_change(self, timeout):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self):
+        if self._dispatcher is not None:
+            return
+        # Jobs cut off by a restart run again; finished videos are kept
+        for job_id in await asyncio.to_thread(self.store.unfinished):
+            job = await asyncio.to_thread(self.store.job, job_id)
+            job["status"] = "queued"
+            job["estimated_units"] = None
+            job["queued_at"] = job["created_at"]
+            self._jobs[job_id] = job
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        # Running jobs stay "running" in the store and are resumed on start
+        tasks = [self._dispatcher, *self._tasks] if self._dispatcher is not None else list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+
+    async def submit(self, links, response_format="rows", refresh=False):
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "response_format": response_format,
+            "status": "queued",
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "estimated_units": None,
+            "videos": [],
+        }
+        cached_results = {}
+        for position, video_url in enumerate(links):
+            video = {"position": position, "video_url": video_url, "video_id": None, "status": "queued",
+                     "from_cache": False, "error": None, "finished_at": None}
+            try:
+                video["video_id"] = parse_video_id(video_url)
+            except (KeyError, IndexError):
+                video.update(status="failed", error="Could not find a video ID in the link", finished_at=now)
+            job["videos"].append(video)
+            if video["status"] != "queued" or refresh or self.result_ttl <= 0:
+                continue
+            cached = await asyncio.to_thread(
+                self.store.cached_result, video["video_id"], response_format, self.result_version,
+                now - self.result_ttl,
+            )
+            if cached is not None:
+                # Keeps the original finish time, so reuse never extends the TTL
+                cached_results[position] = cached[0]
+                video.update(status="done", from_cache=True, finished_at=cached[1])
+
+        if not any(video["status"] == "queued" for video in job["videos"]):
+            job["status"] = _final_status(job)
+            job["finished_at"] = now
+        await asyncio.to_thread(self.store.add_job, job, self.result_version, cached_results)
+        if job["status"] == "queued":
+            job["queued_at"] = now
+            self._jobs[job["job_id"]] = job
+            self._notify()
+        return self._describe(job)
+
+    def _reserved_units(self):
+        # Units running jobs are still expected to spend
+        reserved = 0
+        for job_id, trace in self._traces.items():
+            spent = trace.counts.get("youtube_api_calls", 0)
+            reserved += max((self._jobs[job_id]["estimated_units"] or 0) - spent, 0)
+        return reserved
+
+    def _priority(self, job, now):
+        return job["estimated_units"] / (1 + (now - job["queued_at"]) / self.aging_seconds)
+
+    def _next_job(self):
+        """The queued job to start next, or ``None`` if nothing fits yet."""
+        now = time.time()
+        available = self.quota.remaining() - self._reserved_units()
+        ready = [job for job in self._jobs.values()
+                 if job["status"] == "queued" and job["estimated_units"] is not None]
+        ready.sort(key=lambda job: self._priority(job, now))
+        for job in ready:
+            if job["estimated_units"] <= available:
+                return job
+        # A job larger than the whole budget can never fit, so it runs alone
+        # whenever nothing else is running and some budget is left
+        if not self._traces and self.quota.remaining() > 0:
+            for job in ready:
+                if job["estimated_units"] > self.quota.units:
+                    return job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            if not self.quota.paused_for():
+                for job in self._jobs.values():
+                    if job["status"] == "queued" and job["estimated_units"] is None \
+                            and job["job_id"] not in self._estimating:
+                        self._estimating.add(job["job_id"])
+                        self._spawn(self._estimate(job))
+                while len(self._traces) < self.workers:
+                    job = self._next_job()
+                    if job is None:
+                        break
+                    job["status"] = "running"
+                    self._traces[job["job_id"]], token = start_trace(f"job:{job['job_id']}")
+                    # The task copied the context; the trace stays active only there
+                    self._spawn(self._run(job))
+                    end_trace(token)
+            # Waiting jobs age and quota windows roll over, so look again regularly
+            await self._wait_for_change(self.quota.paused_for() or self.poll_seconds)
+
+    async def _estimate(self, job):
+        units = 0
+        try:
+            for video in job["videos"]:
+                if video["status"] != "queued":
+                    continue
+                try:
+                    units += await asyncio.to_thread(self.estimate_video, video["video_url"])
+                except Exception as error:
+                    if is_quota_error(error):
+                        self.quota.pause()
+                        return
+                    # Broken links fail fast once the job runs
+                    units += 1
+            job["estimated_units"] = units
+            await asyncio.to_thread(self.store.update_job, job["job_id"], estimated_units=units)
+        finally:
+            self._estimating.discard(job["job_id"])
+            self._notify()
+
+    async def _run(self, job):
+        job_id = job["job_id"]
+        if job["started_at"] is None:
+            job["started_at"] = time.time()
+        await asyncio.to_thread(self.store.update_job, job_id, status="running", started_at=job["started_at"])
+        self._notify()
+        try:
+            for video in job["videos"]:
+                if video["status"] != "queued":
+                    continue
+                video["status"] = "running"
+                self._notify()
+                result = None
+                try:
+                    result = await self.run_video(video["video_url"], job["response_format"])
+                    video["status"] = "done"
+                except Exception as error:
+                    if is_quota_error(error):
+                        # Finished videos are kept; the rest wait out the pause
+                        video["status"] = "queued"
+                        job["status"] = "queued"
+                        job["estimated_units"] = None
+                        self.quota.pause()
+                        await asyncio.to_thread(self.store.update_job, job_id, status="queued")
+                        return
+                    video.update(status="failed", error=str(error))
+                video["finished_at"] = time.time()
+                await asyncio.to_thread(self.store.finish_video, job_id, video, result)
+                self._notify()
+
+            job["status"] = _final_status(job)
+            job["finished_at"] = time.time()
+            await asyncio.to_thread(self.store.update_job, job_id, status=job["status"],
+                                    finished_at=job["finished_at"])
+            del self._jobs[job_id]
+        finally:
+            self._traces.pop(job_id, None)
+            self._notify()
+
+    def _describe(self, job):
+        videos = job["videos"]
+        progress = {
+            "videos": len(videos),
+            "done": sum(1 for video in videos if video["status"] == "done"),
+            "failed": sum(1 for video in videos if video["status"] == "failed"),
+        }
+        trace = self._traces.get(job["job_id"])
+        if trace is not None:
+            # Live counts for the current run
+            progress["youtube_api_calls"] = trace.counts.get("youtube_api_calls", 0)
+            progress["comments_scored"] = trace.counts.get("comments_scored", 0)
+        description = {
+            key: job[key]
+            for key in ("job_id", "status", "response_format", "created_at", "started_at",
+                        "finished_at", "estimated_units")
+        }
+        if job["status"] == "queued" and job["estimated_units"] is not None:
+            # Estimated jobs that would start before this one
+            now = time.time()
+            priority = self._priority(job, now)
+            description["queue_position"] = sum(
+                1 for other in self._jobs.values()
+                if other["status"] == "queued" and other["estimated_units"] is not None
+                and self._priority(other, now) < priority
+            )
+        description["progress"] = progress
+        description["videos"] = [dict(video) for video in videos]
+        return description
+
+    async def status(self, job_id):
+        """The job's state, progress and per-video status; ``KeyError`` if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = await asyncio.to_thread(self.store.job, job_id)
+            if job is None:
+                raise KeyError(job_id)
+        return self._describe(job)
+
+    async def video_result(self, job_id, video):
+        if video["status"] == "done":
+            return await asyncio.to_thread(self.store.video_result, job_id, video["position"])
+        return {"video_url": video["video_url"], "error": video["error"]}
+
+    async def results(self, job_id):
+        """Status plus results for every finished video, in link order."""
+        status = await self.status(job_id)
+        status["results"] = [
+            await self.video_result(job_id, video) for video in status["videos"] if video["status"] in FINISHED
+        ]
+        return status
+
+    async def events(self, job_id, interval=1.0):
+        """Yield ``video`` events as results land and ``status`` events on change, until the job ends."""
+        sent = set()
+        last = None
+        while True:
+            status = await self.status(job_id)
+            for video in status["videos"]:
+                if video["status"] in FINISHED and video["position"] not in sent:
+                    sent.add(video["position"])
+                    yield {"type": "video", "job_id": job_id, "position": video["position"],
+                           "result": await self.video_result(job_id, video)}
+            if status != last:
+                yield {"type": "status", **status}
+                last = status
+            if status["status"] in FINISHED:
+                return
+            await self._wait_for_change(interval)
+
+    def summary(self):
+        return {
+            "queued": self.count("queued"),
+            "running": self.count("running"),
+            "workers": self.workers,
+            "quota": self.quota.status(),
+        }
+
+
+def _final_status(job):
+    return "done" if any(video["status"] == "done" for video in job["videos"]) else "failed"
@@ -0,0 +1,55 @@
+# Mirrors model_core/length_buckets.py; the backend is deployed without model_core.
+
+import numpy as np
+
+# Trimmed sequence lengths are rounded up to one of these so the model only
+# ever sees a handful of input shapes (each new shape retraces the predict
+# function). The last bucket is always the vectorizer's full output length.
+DEFAULT_BUCKETS = (16, 32, 64, 128, 256, 512, 1024)
+
+# The LSTM in ToxicityModel does not mask padding, so dropping pad steps
+# shifts the scores slightly. Bucketed predictions are accepted when no
+# per-class score moves by more than this against the fixed-length path.
+PARITY_TOLERANCE = 0.02
+
+
+def sequence_lengths(tokens):
+    # TextVectorization pads with 0 at the end and never emits 0 for a real
+    # token (OOV is 1), so the non-zero count is the real length
+    return np.count_nonzero(tokens, axis=1)
+
+
+def bucket_rows(tokens, buckets=DEFAULT_BUCKETS):
+    """Group row indices of a padded ``(n, max_len)`` token matrix by length bucket.
+
+    Returns a list of ``(bucket_length, row_indices)`` pairs, shortest first.
+    """
+    full_length = tokens.shape[1]
+    edges = np.array([b for b in buckets if b < full_length] + [full_length])
+    lengths = sequence_lengths(tokens)
+    bucket_ids = np.searchsorted(edges, lengths, side='left')
+
+    groups = []
+    for bucket_id in np.unique(bucket_ids):
+        groups.append((int(edges[bucket_id]), np.flatnonzero(bucket_ids == bucket_id)))
+    return groups
+
+
+def predict_bucketed(predict_fn, tokens, buckets=DEFAULT_BUCKETS):
+    """Run ``predict_fn`` once per length bucket on trimmed inputs.
+
+    ``tokens`` is the fixed-length output of the vectorizer. Each bucket is
+    cut down to its bucket length before prediction and the results are
+    scattered back into the original row order.
+    """
+    tokens = np.asarray(tokens)
+    if len(tokens) == 0:
+        return predict_fn(tokens)
+
+    output = None
+    for length, rows in bucket_rows(tokens, buckets):
+        scores = np.asarray(predict_fn(tokens[rows, :length]))
+        if output is None:
+            output = np.empty((len(tokens), scores.shape[1]), dtype=scores.dtype)
+        output[rows] = scores
+    return output
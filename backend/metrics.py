@@ -0,0 +1,299 @@
+"""In-process metrics with Prometheus text exposition, plus per-request traces.
+
+Counters and histograms are plain Python objects behind one lock each, so
+recording costs a few microseconds; run ``python metrics.py`` to measure
+it. ``render()`` produces the format served at ``GET /metrics``.
+
+``stage(name)`` times a block into the ``toxicity_stage_seconds``
+histogram and, if a request trace is active in the current context (see
+``start_trace``), into that trace as well.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+# Seconds; covers sub-millisecond stages up to multi-minute video fetches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """One metric family; ``labels(...)`` returns the child for a label set."""
+
+    def __init__(self, name, help, kind, label_names=(), buckets=DEFAULT_BUCKETS, callback=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # Gauges are read at scrape time, so they cost nothing in between
+        self.callback = callback
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names and callback is None:
+            # Unlabeled series are exported as 0 before the first event
+            self.labels()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = _HistogramChild(self.buckets) if self.kind == "histogram" else _CounterChild()
+                    self._children[values] = child
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def total(self):
+        # Counters only: the sum over every label set
+        return sum(child.value for child in list(self._children.values()))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.callback is not None:
+            lines.append(f"{self.name} {_format_value(self.callback())}")
+            return lines
+        for values, child in sorted(self._children.items()):
+            if self.kind == "histogram":
+                with child._lock:
+                    counts, total = list(child.counts), child.sum
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    labels = _format_labels(self.label_names, values, [f'le="{le}"'])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, values)
+                lines.append(f"{self.name}_sum{labels} {total!r}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, label_names=()):
+        return self._add(Metric(name, help, "counter", label_names))
+
+    def histogram(self, name, help, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Metric(name, help, "histogram", label_names, buckets))
+
+    def gauge(self, name, help, callback):
+        return self._add(Metric(name, help, "gauge", callback=callback))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "toxicity_stage_seconds", "Time spent per pipeline stage", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "toxicity_request_seconds", "HTTP request latency", ("path", "status"))
+BATCH_SIZE = REGISTRY.histogram(
+    "toxicity_batch_size", "Comments per model batch", buckets=SIZE_BUCKETS)
+COMMENTS_SCORED = REGISTRY.counter(
+    "toxicity_comments_scored_total", "Comments sent to the model")
+YOUTUBE_CALLS = REGISTRY.counter(
+    "toxicity_youtube_api_calls_total", "YouTube Data API calls, retries included", ("method",))
+YOUTUBE_ERRORS = REGISTRY.counter(
+    "toxicity_youtube_api_errors_total", "YouTube Data API errors by HTTP status", ("method", "status"))
+YOUTUBE_QUOTA_ERRORS = REGISTRY.counter(
+    "toxicity_youtube_quota_errors_total", "Rate-limit and quota errors from the YouTube Data API")
+
+
+class Trace:
+    """Stage timings and counts for one request, for structured logs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def record(self, status):
+        return {
+            "path": self.path,
+            "status": status,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+            **self.counts,
+        }
+
+
+_current_trace = contextvars.ContextVar("toxicity_trace", default=None)
+
+
+def start_trace(path):
+    trace = Trace(path)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def trace_count(name, amount=1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, amount)
+
+
+class stage:
+    """``with stage("predict"): ...`` times the block."""
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        STAGE_SECONDS.labels(self.name).observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, seconds)
+
+
+class TraceMiddleware:
+    """ASGI middleware: request latency histogram plus a trace per request.
+
+    The trace is active for the whole call, streamed bodies included, and
+    ``on_trace(record)`` receives its summary when the response is done.
+    Both are labelled with the route template, not the raw path.
+    """
+
+    def __init__(self, app, on_trace=None, skip_paths=("/metrics",)):
+        self.app = app
+        self.on_trace = on_trace
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace, token = start_trace(scope["path"])
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            end_trace(token)
+            # Routing stores the matched route in the scope. Its template
+            # ("/jobs/{job_id}") keeps one series per endpoint however many
+            # IDs are requested; unmatched paths share a single label.
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            trace.path = path
+            REQUEST_SECONDS.labels(path, str(status)).observe(time.perf_counter() - trace.start)
+            if self.on_trace is not None and path not in self.skip_paths:
+                self.on_trace(trace.record(status))
+
+
+def measure_overhead(iterations=200000):
+    """Per-call cost of ``stage()`` with and without an active trace, in microseconds."""
+    def timed_loop():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with stage("overhead_probe"):
+                pass
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    empty = (time.perf_counter() - start) / iterations * 1e6
+
+    untraced = timed_loop()
+    _, token = start_trace("overhead")
+    traced = timed_loop()
+    end_trace(token)
+    del STAGE_SECONDS._children[("overhead_probe",)]
+    return {"untraced_us": untraced - empty, "traced_us": traced - empty}
+
+
+if __name__ == "__main__":
+    # A request passes through roughly 10 stages and one batch; compare the
+    # cost below with per-request latency (tens of ms on CPU)
+    overhead = measure_overhead()
+    print(f"stage(): {overhead['untraced_us']:.2f} us untraced, {overhead['traced_us']:.2f} us traced")
+    per_request_ms = 10 * overhead["traced_us"] / 1000
+    print(f"~{per_request_ms:.3f} ms per request, {per_request_ms / 20:.3%} of a 20 ms request")
@@ -0,0 +1,175 @@
+import json
+import os
+import pickle
+import resource
+import threading
+import time
+
+import numpy as np
+
+from prediction_cache import model_version
+from runtimes import ENGINES, KerasRuntime, TFLiteRuntime
+from tokenizer import NumpyVectorizer
+
+TOKENIZERS = ('numpy', 'tf')
+
+
+def max_rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelArtifacts:
+    """Lazily loaded model + vectorizer, from a bundle or the legacy pkl/h5 pair.
+
+    Nothing heavy happens at import: TensorFlow is imported and the
+    artifacts are read on the first ``ensure_loaded()`` (normally kicked
+    off in the background at startup), followed by one warm-up inference.
+    ``status()`` reports progress for the health endpoint.
+
+    ``engine`` picks the runtime behind ``predict()``: the Keras model, or
+    the quantized TFLite export at ``tflite_path`` (the Keras model is then
+    never loaded). With ``load_model=False`` only the vectorizer is
+    loaded, for a process that hands tokens to inference workers.
+
+    ``tokenizer`` picks the vectorizer: the TF ``TextVectorization`` layer
+    or ``'numpy'`` (see tokenizer.py), which should produce the same tokens
+    from the same config and vocabulary once check_tokenizer_parity.py
+    passes. With ``'numpy'`` and ``load_model=False`` TensorFlow is never
+    imported.
+    """
+
+    def __init__(self, bundle_path='toxicity_bundle', model_path='toxicity.h5', vectorizer_path='vectorizer.pkl',
+                 engine='keras', tflite_path='toxicity.tflite', tflite_threads=None, load_model=True,
+                 tokenizer='tf'):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown inference engine {engine!r}; expected one of {ENGINES}")
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Unknown tokenizer {tokenizer!r}; expected one of {TOKENIZERS}")
+        self.bundle_path = bundle_path
+        self.model_path = model_path
+        self.vectorizer_path = vectorizer_path
+        self.engine = engine
+        self.tflite_path = tflite_path
+        self.tflite_threads = tflite_threads
+        self.load_model = load_model
+        self.tokenizer = tokenizer
+        self.manifest = None
+        if os.path.exists(os.path.join(bundle_path, 'manifest.json')):
+            with open(os.path.join(bundle_path, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+
+        self.model = None
+        self.vectorizer = None
+        self.vectorizer_config = None
+        self.runtime = None
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def source(self):
+        return "bundle" if self.manifest else "legacy"
+
+    @property
+    def version(self):
+        # Cheap to read before the model is loaded, so caches can key on it
+        if self._version is None:
+            if self.manifest:
+                self._version = self.manifest['version']
+            else:
+                self._version = model_version(self.model_path, self.vectorizer_path)
+            if self.engine == 'tflite':
+                # Quantized scores differ slightly, so they get their own keys
+                self._version = model_version(self.tflite_path, extra=self._version)
+        return self._version
+
+    @property
+    def sequence_length(self):
+        return self.vectorizer_config['output_sequence_length']
+
+    @property
+    def thresholds(self):
+        return self.manifest.get('thresholds') if self.manifest else None
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self.state == "ready":
+                return
+            self.state = "loading"
+            try:
+                self._load()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                raise
+            self.state = "ready"
+            self.error = None
+
+    def _load(self):
+        start = time.perf_counter()
+        if self.manifest:
+            config = self.manifest['vectorizer_config']
+            # The lookup table is built straight from the file
+            vocab = os.path.join(self.bundle_path, 'vocab.txt')
+            model_path = os.path.join(self.bundle_path, 'model.keras')
+        else:
+            # Load vectorizer config and vocab instead of the entire object
+            with open(self.vectorizer_path, 'rb') as f:
+                config, vocab = pickle.load(f)
+            model_path = self.model_path
+        self.vectorizer_config = config
+        if self.tokenizer == 'numpy':
+            self.vectorizer = NumpyVectorizer.from_config(config, vocab)
+        else:
+            from tensorflow.keras.layers import TextVectorization
+
+            self.vectorizer = TextVectorization.from_config(config)
+            self.vectorizer.set_vocabulary(vocab)
+        if not self.load_model:
+            self.load_seconds = time.perf_counter() - start
+            return
+        if self.engine == 'tflite':
+            self.runtime = TFLiteRuntime(self.tflite_path, num_threads=self.tflite_threads)
+        else:
+            from tensorflow.keras.models import load_model
+
+            self.model = load_model(model_path)
+            self.runtime = KerasRuntime(self.model)
+        self.load_seconds = time.perf_counter() - start
+
+        # Trace the predict function now rather than on the first request
+        start = time.perf_counter()
+        self.runtime.predict(self.tokenize(["warm up"]), batch_size=1)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def tokenize(self, texts, out=None):
+        """Token ids for ``texts``; fills the first rows of ``out`` if given."""
+        if out is not None and self.tokenizer == 'numpy':
+            return self.vectorizer(texts, out=out)
+        tokens = self.vectorizer(texts)
+        # The TF layer returns a tensor, NumpyVectorizer an array
+        tokens = tokens if isinstance(tokens, np.ndarray) else tokens.numpy()
+        if out is None:
+            return tokens
+        out[:len(tokens)] = tokens
+        return out[:len(tokens)]
+
+    def predict(self, tokens, batch_size):
+        return self.runtime.predict(tokens, batch_size)
+
+    def status(self):
+        return {
+            "status": self.state,
+            "source": self.source,
+            "engine": self.engine,
+            "tokenizer": self.tokenizer,
+            "model_version": self.version,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "max_rss_mb": round(max_rss_mb(), 1),
+            "error": self.error,
+        }
@@ -0,0 +1,59 @@
+import base64
+
+import numpy as np
+
+
+def apply_thresholds(scores, thresholds):
+    # (n, 6) scores against per-class thresholds in one comparison
+    return (np.asarray(scores) > np.asarray(thresholds)).astype(np.int8)
+
+
+def round_scores(scores, decimals=4):
+    # Round in float64 so tolist() yields short floats like 0.1234
+    return np.round(np.asarray(scores, dtype=np.float64), decimals)
+
+
+def row_results(texts, scores, thresholds, class_names):
+    """The original per-comment objects, built from whole-matrix operations."""
+    labels = apply_thresholds(scores, thresholds).tolist()
+    rounded = round_scores(scores).tolist()
+    return [
+        {
+            "text": text,
+            "prediction": pred,
+            "raw_scores": raw,
+            "class_names": class_names
+        }
+        for text, pred, raw in zip(texts, labels, rounded)
+    ]
+
+
+def columnar_results(texts, scores, thresholds, class_names, binary=False):
+    """Compact layout: class names once, then aligned text/score/label columns.
+
+    With ``binary=True`` the score matrix is little-endian float16 and the
+    label matrix uint8, both base64-encoded in row-major order.
+    """
+    scores = np.asarray(scores, dtype=np.float32).reshape(len(texts), len(class_names))
+    labels = apply_thresholds(scores, thresholds)
+    result = {
+        "format": "columnar_f16" if binary else "columnar",
+        "class_names": class_names,
+        "shape": list(scores.shape),
+        "texts": list(texts),
+    }
+    if binary:
+        result["scores"] = base64.b64encode(scores.astype('<f2').tobytes()).decode('ascii')
+        result["labels"] = base64.b64encode(labels.astype(np.uint8).tobytes()).decode('ascii')
+    else:
+        result["scores"] = round_scores(scores).tolist()
+        result["labels"] = labels.tolist()
+    return result
+
+
+def format_results(texts, scores, thresholds, class_names, response_format="rows"):
+    if response_format == "columnar":
+        return columnar_results(texts, scores, thresholds, class_names)
+    if response_format == "columnar_f16":
+        return columnar_results(texts, scores, thresholds, class_names, binary=True)
+    return row_results(texts, scores, thresholds, class_names)
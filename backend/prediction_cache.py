@@ -0,0 +1,165 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Same rules as TextVectorization's default 'lower_and_strip_punctuation'
+# standardization and whitespace split, so two texts share a key only when
+# the model would see exactly the same tokens.
+_STRIP_PUNCTUATION = re.compile(r'[!"#$%&()\*\+,-\./:;<=>?@\[\\\]^_`{|}~\']')
+_WHITESPACE = re.compile(r'[ \t\n\r\f\v]+')
+
+
+def normalize_text(text):
+    # tf.strings.lower only lowercases ASCII: "ÜBER" and "über" are
+    # different tokens to the model, so they must stay different keys
+    lowered = text.encode('utf-8', 'surrogatepass').lower().decode('utf-8', 'surrogatepass')
+    stripped = _STRIP_PUNCTUATION.sub('', lowered)
+    return ' '.join(token for token in _WHITESPACE.split(stripped) if token)
+
+
+def model_version(*paths, extra=''):
+    # Content hash of the model artifacts: replacing toxicity.h5 or
+    # vectorizer.pkl changes every key, so stale scores are never served
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    digest.update(extra.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class SqliteCacheBackend:
+    """On-disk second level for PredictionCache that survives restarts."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, scores BLOB NOT NULL, created REAL NOT NULL)"
+            )
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, scores, created FROM predictions WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, scores, created in rows:
+                    found[key] = (np.frombuffer(scores, dtype=np.float32), created)
+        return found
+
+    def put_many(self, items):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO predictions (key, scores, created) VALUES (?, ?, ?)",
+                [(key, scores.astype(np.float32).tobytes(), created) for key, scores, created in items],
+            )
+
+    def prune(self, older_than):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM predictions WHERE created < ?", (older_than,))
+
+    def close(self):
+        self._conn.close()
+
+
+class PredictionCache:
+    """Bounded LRU + TTL cache of raw 6-class score vectors.
+
+    Keys are a hash of the normalized text and the model version. An optional
+    ``backend`` (e.g. SqliteCacheBackend) is consulted on in-memory misses and
+    written through on every insert.
+    """
+
+    def __init__(self, version, max_entries=100000, ttl_seconds=86400, backend=None):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if backend is not None:
+            backend.prune(time.time() - ttl_seconds)
+
+    def key(self, text):
+        payload = f"{self.version}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def get_many(self, texts):
+        """Look up ``texts``; returns ``(keys, scores)`` with ``None`` for misses."""
+        keys = [self.key(text) for text in texts]
+        scores = [None] * len(keys)
+        now = time.time()
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    scores[i] = entry[0]
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    missing.append(i)
+
+        if missing and self.backend is not None:
+            stored = self.backend.get_many(list({keys[i] for i in missing}))
+            still_missing = []
+            with self._lock:
+                for i in missing:
+                    entry = stored.get(keys[i])
+                    if entry is not None and now - entry[1] <= self.ttl_seconds:
+                        scores[i] = entry[0]
+                        self._insert(keys[i], entry[0], entry[1])
+                    else:
+                        still_missing.append(i)
+            missing = still_missing
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return keys, scores
+
+    def put_many(self, keys, scores):
+        now = time.time()
+        with self._lock:
+            for key, row in zip(keys, scores):
+                self._insert(key, row, now)
+        if self.backend is not None:
+            self.backend.put_many([(key, row, now) for key, row in zip(keys, scores)])
+
+    def _insert(self, key, scores, created):
+        self._entries[key] = (np.asarray(scores, dtype=np.float32), created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.backend is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,47 @@
+import numpy as np
+
+ENGINES = ("keras", "tflite")
+
+
+class KerasRuntime:
+    """Runs token batches through the full Keras model."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, tokens, batch_size):
+        return self.model.predict(tokens, batch_size=batch_size, verbose=0)
+
+
+class TFLiteRuntime:
+    """Runs token batches through a TFLite export from model_core/export_tflite.py.
+
+    The interpreter is not thread-safe; it is only driven from the
+    batcher's single inference thread (and the warm-up before that).
+    Tensors are reallocated only when the batch shape changes.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        # The export fixes the sequence length; only the batch dimension varies
+        self.sequence_length = int(self.interpreter.get_input_details()[0]["shape_signature"][1])
+        self.shape = None
+
+    def _invoke(self, tokens):
+        if tokens.shape != self.shape:
+            self.interpreter.resize_tensor_input(self.input_index, tokens.shape)
+            self.interpreter.allocate_tensors()
+            self.shape = tokens.shape
+        self.interpreter.set_tensor(self.input_index, tokens)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+    def predict(self, tokens, batch_size):
+        tokens = np.ascontiguousarray(tokens, dtype=np.int32)
+        if tokens.shape[1] != self.sequence_length:
+            raise ValueError(f"TFLite model expects {self.sequence_length} tokens per row, got {tokens.shape[1]}")
+        return np.concatenate([self._invoke(tokens[i:i + batch_size]) for i in range(0, len(tokens), batch_size)])
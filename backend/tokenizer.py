@@ -0,0 +1,110 @@
+"""TextVectorization's ``int`` output without TensorFlow.
+
+The layer's rules are all ASCII-only once texts are UTF-8 bytes:
+``tf.strings.lower`` lowercases ASCII letters only, punctuation stripping
+removes ``string.punctuation``, and the whitespace split breaks on ASCII
+whitespace. ``bytes.lower``, ``bytes.translate`` and ``bytes.split`` do
+exactly the same. Tokens are then looked up in a dict built once from the
+vocabulary and written into a preallocated int array.
+
+``NumpyVectorizer`` holds no mutable state, so any number of threads can
+call it at once. Check it against the real layer with
+``check_tokenizer_parity.py`` and time both with ``bench_tokenizer.py``.
+"""
+import itertools
+import string
+
+import numpy as np
+
+PAD_ID = 0
+OOV_ID = 1
+# get_vocabulary() starts with these; a bundle's vocab.txt leaves them out
+RESERVED_TOKENS = ('', '[UNK]')
+
+STANDARDIZE_MODES = ('lower_and_strip_punctuation', 'lower', 'strip_punctuation', None)
+_PUNCTUATION = string.punctuation.encode('ascii')
+
+
+def read_vocab_file(path):
+    # One token per line; only "\n" separates them, tokens may contain
+    # other Unicode line breaks
+    with open(path, encoding='utf-8', newline='') as f:
+        tokens = f.read().split('\n')
+    if tokens and tokens[-1] == '':
+        tokens.pop()
+    return list(RESERVED_TOKENS) + tokens
+
+
+class NumpyVectorizer:
+    """Drop-in for a ``TextVectorization(output_mode='int')`` layer's call.
+
+    ``vectorizer(texts)`` returns the same ``(len(texts), sequence_length)``
+    int64 array as ``layer(texts).numpy()``: token ids padded with 0 and
+    truncated to ``sequence_length``, or padded to the longest text when
+    ``sequence_length`` is ``None``.
+    """
+
+    def __init__(self, vocab, sequence_length, standardize='lower_and_strip_punctuation', split='whitespace'):
+        if list(vocab[:len(RESERVED_TOKENS)]) != list(RESERVED_TOKENS):
+            raise ValueError("Vocabulary must start with the padding and OOV tokens from get_vocabulary()")
+        if standardize not in STANDARDIZE_MODES:
+            raise ValueError(f"Unsupported standardize {standardize!r}; expected one of {STANDARDIZE_MODES}")
+        if split != 'whitespace':
+            raise ValueError(f"Unsupported split {split!r}; only 'whitespace' is implemented")
+        self.sequence_length = sequence_length
+        self.lower = standardize in ('lower', 'lower_and_strip_punctuation')
+        self.strip_punctuation = standardize in ('strip_punctuation', 'lower_and_strip_punctuation')
+        self.lookup = {token.encode('utf-8'): index for index, token in enumerate(vocab) if index >= len(RESERVED_TOKENS)}
+
+    @classmethod
+    def from_config(cls, config, vocab):
+        """Build from ``layer.get_config()`` and a vocabulary list or vocab.txt path."""
+        for key, expected in (('output_mode', 'int'), ('ngrams', None), ('ragged', False), ('sparse', False)):
+            if config.get(key, expected) != expected:
+                raise ValueError(f"Unsupported vectorizer config {key}={config[key]!r}; use the TF tokenizer")
+        if str(config.get('encoding', 'utf-8')).lower().replace('-', '') != 'utf8':
+            raise ValueError(f"Unsupported vectorizer encoding {config['encoding']!r}; use the TF tokenizer")
+        if isinstance(vocab, str):
+            vocab = read_vocab_file(vocab)
+        return cls(
+            vocab,
+            config.get('output_sequence_length'),
+            standardize=config.get('standardize', 'lower_and_strip_punctuation'),
+            split=config.get('split', 'whitespace'),
+        )
+
+    def tokens(self, text):
+        """The text's tokens as UTF-8 bytes, as the layer would split them."""
+        data = text.encode('utf-8', 'surrogatepass')
+        if self.lower:
+            data = data.lower()
+        if self.strip_punctuation:
+            data = data.translate(None, _PUNCTUATION)
+        return data.split()
+
+    def __call__(self, texts, out=None):
+        """Token ids for ``texts``; fills the first rows of ``out`` if given."""
+        width = self.sequence_length
+        if width is None and out is not None:
+            width = out.shape[1]
+        get = self.lookup.get
+        rows = [[get(token, OOV_ID) for token in self.tokens(text)[:width]] for text in texts]
+        lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+        if width is None:
+            width = int(lengths.max(initial=0))
+
+        if out is None:
+            out = np.zeros((len(rows), width), dtype=np.int64)
+        else:
+            if out.shape[0] < len(rows) or out.shape[1] != width:
+                raise ValueError(f"Output buffer of shape {out.shape} cannot hold {len(rows)} rows of {width} tokens")
+            out = out[:len(rows)]
+            out[:] = PAD_ID
+
+        total = int(lengths.sum())
+        flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=out.dtype, count=total)
+        # Flat position of every id: its row's start plus its place in the row,
+        # so the cost follows the number of tokens, not rows times width
+        row_offsets = np.arange(len(rows), dtype=np.int64) * width - (np.cumsum(lengths) - lengths)
+        out.reshape(-1)[np.repeat(row_offsets, lengths) + np.arange(total)] = flat
+        return out
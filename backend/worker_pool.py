@@ -0,0 +1,271 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from length_buckets import predict_bucketed
+from metrics import stage
+from model_loader import ModelArtifacts
+
+logger = logging.getLogger("toxicity")
+
+
+def _worker_main(conn, input_name, output_name, max_rows, sequence_length, num_classes,
+                 artifacts_kwargs, intra_op_threads, inter_op_threads, dynamic_length):
+    # Thread pools must be sized before TensorFlow runs its first op
+    import tensorflow as tf
+
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+    inputs = SharedMemory(name=input_name)
+    outputs = SharedMemory(name=output_name)
+    try:
+        artifacts = ModelArtifacts(**artifacts_kwargs)
+        artifacts.ensure_loaded()
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+    tokens = np.ndarray((max_rows, sequence_length), dtype=np.int32, buffer=inputs.buf)
+    scores = np.ndarray((max_rows, num_classes), dtype=np.float32, buffer=outputs.buf)
+
+    def predict_tokens(batch):
+        return artifacts.predict(batch, batch_size=max_rows)
+
+    conn.send(("ready", artifacts.status()))
+    while True:
+        rows = conn.recv()
+        if rows is None:
+            break
+        try:
+            batch = tokens[:rows]
+            scores[:rows] = predict_bucketed(predict_tokens, batch) if dynamic_length else predict_tokens(batch)
+            conn.send(("ok", rows))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+    del tokens, scores
+    inputs.close()
+    outputs.close()
+
+
+class WorkerPool:
+    """Worker processes that each hold a preloaded model.
+
+    Every worker owns a pair of shared-memory buffers sized for
+    ``max_rows`` token rows and their scores. ``predict(texts, tokenize)``
+    has ``tokenize(chunk, out)`` write each chunk's tokens straight into an
+    idle worker's input buffer and sends only the row count over a pipe, so
+    token arrays are never copied or pickled. ``predict`` is blocking and
+    thread-safe; up to ``num_workers`` calls run at once.
+
+    Workers are spawned (TensorFlow is not fork-safe) and load the model
+    themselves, so ``start()`` takes as long as the slowest cold start.
+    A worker that dies is never handed out again: it is replaced in the
+    background while the others keep serving.
+    """
+
+    def __init__(self, num_workers, artifacts_kwargs, max_rows=64, num_classes=6,
+                 threads_per_worker=0, inter_op_threads=1, dynamic_length=False):
+        self.num_workers = num_workers
+        self.artifacts_kwargs = artifacts_kwargs
+        self.max_rows = max_rows
+        self.num_classes = num_classes
+        # Split the cores evenly unless told otherwise
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.inter_op_threads = inter_op_threads
+        self.dynamic_length = dynamic_length
+
+        self.state = "not_started"
+        self.error = None
+        self.sequence_length = None
+        self.restarts = 0
+        self._workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        # Guards the worker list against respawns; start() holds _lock throughout
+        self._workers_lock = threading.Lock()
+
+    def start(self, sequence_length):
+        with self._lock:
+            if self.state == "ready":
+                return
+            if self.state == "failed":
+                raise RuntimeError(f"Worker pool failed to start: {self.error}")
+            self.state = "starting"
+            self.sequence_length = sequence_length
+            try:
+                self._spawn()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                self.close()
+                raise
+            self.state = "ready"
+
+    def _spawn(self):
+        context = multiprocessing.get_context("spawn")
+        for _ in range(self.num_workers):
+            self._workers.append(self._launch(context))
+
+        # Workers load in parallel; wait for all of them
+        for worker in self._workers:
+            self._wait_ready(worker)
+            self._idle.put(worker)
+
+    def _launch(self, context):
+        inputs = SharedMemory(create=True, size=self.max_rows * self.sequence_length * 4)
+        outputs = SharedMemory(create=True, size=self.max_rows * self.num_classes * 4)
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(child_conn, inputs.name, outputs.name, self.max_rows, self.sequence_length,
+                  self.num_classes, self.artifacts_kwargs, self.threads_per_worker,
+                  self.inter_op_threads, self.dynamic_length),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return {
+            "process": process,
+            "conn": conn,
+            "inputs": inputs,
+            "outputs": outputs,
+            "tokens": np.ndarray((self.max_rows, self.sequence_length), dtype=np.int32, buffer=inputs.buf),
+            "scores": np.ndarray((self.max_rows, self.num_classes), dtype=np.float32, buffer=outputs.buf),
+        }
+
+    @staticmethod
+    def _wait_ready(worker):
+        try:
+            kind, detail = worker["conn"].recv()
+        except (EOFError, OSError):
+            kind, detail = "error", f"exited with code {worker['process'].exitcode}"
+        if kind != "ready":
+            raise RuntimeError(f"Worker {worker['process'].pid} failed to load the model: {detail}")
+
+    def _checkout(self):
+        while True:
+            try:
+                worker = self._idle.get(timeout=1)
+            except queue.Empty:
+                if self.state == "failed":
+                    raise RuntimeError(f"Worker pool failed: {self.error}")
+                continue
+            if worker["process"].is_alive():
+                return worker
+            # Died while idle
+            self._replace(worker)
+
+    def _replace(self, worker):
+        """Retire a dead worker and start a replacement in the background."""
+        with self._workers_lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self.restarts += 1
+        self._release(worker)
+        logger.warning("Inference worker %s died (exit code %s), starting a replacement",
+                       worker["process"].pid, worker["process"].exitcode)
+        threading.Thread(target=self._respawn, name="inference-respawn", daemon=True).start()
+
+    def _respawn(self):
+        # Other workers keep serving while the replacement loads the model
+        try:
+            worker = self._launch(multiprocessing.get_context("spawn"))
+        except Exception as e:
+            self._respawn_failed(e)
+            return
+        try:
+            self._wait_ready(worker)
+        except Exception as e:
+            self._release(worker)
+            self._respawn_failed(e)
+            return
+        with self._workers_lock:
+            if self.state != "ready":
+                # Closed while loading
+                closed = True
+            else:
+                closed = False
+                self._workers.append(worker)
+        if closed:
+            self._stop(worker)
+            self._release(worker)
+        else:
+            self._idle.put(worker)
+
+    def _respawn_failed(self, error):
+        logger.error("Could not replace an inference worker: %s", error)
+        with self._workers_lock:
+            self.error = str(error)
+            if not self._workers:
+                self.state = "failed"
+
+    def predict(self, texts, tokenize):
+        worker = self._checkout()
+        try:
+            parts = []
+            for i in range(0, len(texts), self.max_rows):
+                chunk = texts[i:i + self.max_rows]
+                tokenize(chunk, worker["tokens"])
+                try:
+                    with stage("predict"):
+                        worker["conn"].send(len(chunk))
+                        kind, detail = worker["conn"].recv()
+                except (EOFError, OSError):
+                    # Crashed or was killed mid-batch: never hand it out again
+                    dead, worker = worker, None
+                    dead["process"].join(timeout=1)
+                    self._replace(dead)
+                    raise RuntimeError(f"Inference worker {dead['process'].pid} died during a batch")
+                if kind != "ok":
+                    raise RuntimeError(f"Inference worker error: {detail}")
+                parts.append(worker["scores"][:len(chunk)].copy())
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    @staticmethod
+    def _stop(worker):
+        try:
+            worker["conn"].send(None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _release(worker):
+        worker["process"].join(timeout=5)
+        if worker["process"].is_alive():
+            worker["process"].terminate()
+        # Views into the buffers must go before the mappings close
+        del worker["tokens"], worker["scores"]
+        for block in (worker["inputs"], worker["outputs"]):
+            block.close()
+            block.unlink()
+
+    def close(self):
+        with self._workers_lock:
+            workers, self._workers = self._workers, []
+            if self.state == "ready":
+                self.state = "not_started"
+        for worker in workers:
+            self._stop(worker)
+        for worker in workers:
+            self._release(worker)
+        self._idle = queue.Queue()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "restarts": self.restarts,
+            "error": self.error,
+        }
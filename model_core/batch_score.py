@@ -0,0 +1,228 @@
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import CLASS_NAMES
+
+PROGRESS_FILE = '_progress.json'
+
+# Per-process model and vectorizer, set up once by _init_worker
+_worker = {}
+
+
+def input_fingerprint(path):
+    # Size + mtime + the first MB: cheap even for very large dumps, and
+    # enough to notice the input changed between a run and its resume
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = f.read(1 << 20)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime), 'head': hashlib.sha256(head).hexdigest()[:16]}
+
+
+def iter_input(path, chunk_rows):
+    """Yield ``(chunk_index, DataFrame, fraction_read)`` from a CSV or Parquet file."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        total = parquet_file.metadata.num_rows
+        done = 0
+        for index, batch in enumerate(parquet_file.iter_batches(batch_size=chunk_rows)):
+            done += batch.num_rows
+            yield index, batch.to_pandas(), done / total
+    else:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            for index, chunk in enumerate(pd.read_csv(f, chunksize=chunk_rows)):
+                # The parser reads ahead, so this runs slightly early
+                yield index, chunk, min(f.tell() / size, 1.0)
+
+
+def _init_worker(vectorizer_path, model_path, bundle_path, threads):
+    from trainer import configure_threads
+
+    configure_threads(intra_op_threads=threads, inter_op_threads=1)
+    if bundle_path:
+        from model_bundle import load_bundle
+
+        model, vectorizer, _ = load_bundle(bundle_path)
+    else:
+        from tensorflow.keras.layers import TextVectorization
+        from tensorflow.keras.models import load_model
+
+        with open(vectorizer_path, 'rb') as f:
+            config, vocab = pickle.load(f)
+        vectorizer = TextVectorization.from_config(config)
+        vectorizer.set_vocabulary(vocab)
+        model = load_model(model_path)
+    _worker.update(model=model, vectorizer=vectorizer)
+
+
+def _score_chunk(index, texts, kept, batch_size, shard_path):
+    """Vectorize and predict one chunk, then write its shard atomically."""
+    model, vectorizer = _worker['model'], _worker['vectorizer']
+    scores = np.empty((len(texts), len(CLASS_NAMES)), dtype=np.float32)
+    # Vectorize per model batch so a chunk never holds all of its
+    # 1800-token rows at once
+    for start in range(0, len(texts), batch_size):
+        tokens = vectorizer(texts[start:start + batch_size])
+        scores[start:start + batch_size] = model.predict(tokens, batch_size=batch_size, verbose=0)
+
+    for i, class_name in enumerate(CLASS_NAMES):
+        kept[class_name] = scores[:, i]
+    tmp_path = f"{shard_path}.tmp"
+    kept.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, shard_path)
+    return index, len(texts)
+
+
+def load_progress(output_dir, settings):
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            progress = json.load(f)
+        if progress['settings'] != settings:
+            raise SystemExit(
+                f"{output_dir} holds a run with different settings:\n  {progress['settings']}\n"
+                f"Use a new --output directory or pass --restart."
+            )
+        return progress
+    return {'settings': settings, 'completed': [], 'rows': 0, 'finished': False}
+
+
+def save_progress(output_dir, progress):
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(progress, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def format_eta(seconds):
+    if seconds is None or not np.isfinite(seconds):
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def main():
+    # Score a large CSV/Parquet comment archive into sharded Parquet:
+    #   python batch_score.py comments.csv --output scored/ --workers 8
+    # Re-running the same command after an interruption skips the chunks
+    # whose shards already exist.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', help=".csv or .parquet file")
+    parser.add_argument('--output', required=True, help="directory for part-*.parquet shards")
+    parser.add_argument('--text-column', default='comment_text')
+    parser.add_argument('--keep-columns', default=None, help="comma-separated columns to copy; default all but the text")
+    parser.add_argument('--keep-text', action='store_true', help="also copy the text column")
+    parser.add_argument('--chunk-rows', type=int, default=50000, help="rows per chunk and per output shard")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    parser.add_argument('--threads-per-worker', type=int, default=0, help="default splits the cores evenly")
+    parser.add_argument('--vectorizer', default='vectorizer.pkl')
+    parser.add_argument('--model', default='toxicity.h5')
+    parser.add_argument('--bundle', default=None, help="load a model bundle instead of the .pkl/.h5 pair")
+    parser.add_argument('--restart', action='store_true', help="discard progress from an earlier run")
+    args = parser.parse_args()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    settings = {
+        'input': os.path.abspath(args.input),
+        'fingerprint': input_fingerprint(args.input),
+        'chunk_rows': args.chunk_rows,
+        'text_column': args.text_column,
+        'keep_columns': args.keep_columns,
+        'keep_text': args.keep_text,
+    }
+    if args.restart and os.path.exists(os.path.join(args.output, PROGRESS_FILE)):
+        os.remove(os.path.join(args.output, PROGRESS_FILE))
+    progress = load_progress(args.output, settings)
+    if progress['finished']:
+        print(f"Already complete: {progress['rows']} rows in {args.output}")
+        return
+    completed = set(progress['completed'])
+    if completed:
+        print(f"Resuming: {len(completed)} chunks ({progress['rows']} rows) already scored")
+    save_progress(args.output, progress)
+
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(
+        args.workers,
+        initializer=_init_worker,
+        initargs=(args.vectorizer, args.model, args.bundle, threads),
+    )
+
+    start = time.perf_counter()
+    rows_this_run = 0
+    # Share of the input already scored by earlier runs, for the ETA
+    fraction_at_start = None
+    fraction = 0.0
+    # Bounded so reading never runs far ahead of scoring
+    in_flight = collections.deque()
+
+    def finish_oldest():
+        nonlocal rows_this_run
+        index, rows = in_flight.popleft().get()
+        rows_this_run += rows
+        if index not in completed:
+            # A recorded chunk is only redone if its shard went missing
+            completed.add(index)
+            progress['rows'] += rows
+        progress['completed'] = sorted(completed)
+        save_progress(args.output, progress)
+
+        elapsed = time.perf_counter() - start
+        rate = rows_this_run / elapsed
+        covered = fraction - (fraction_at_start or 0.0)
+        eta = elapsed * (1 - fraction) / covered if covered > 0 else None
+        print(f"chunk {index}: {progress['rows']} rows total, {rate:,.0f} rows/s, "
+              f"{fraction:.1%} read, ETA {format_eta(eta)}", flush=True)
+
+    try:
+        read_before = 0.0
+        for index, chunk, fraction in iter_input(args.input, args.chunk_rows):
+            shard_path = os.path.join(args.output, f"part-{index:06d}.parquet")
+            if index in completed and os.path.exists(shard_path):
+                read_before = fraction
+                continue
+            if fraction_at_start is None:
+                fraction_at_start = read_before
+            if args.text_column not in chunk.columns:
+                raise SystemExit(f"Column {args.text_column!r} not found; columns are {list(chunk.columns)}")
+
+            texts = chunk[args.text_column].fillna('').astype(str).tolist()
+            if args.keep_columns:
+                columns = args.keep_columns.split(',')
+            else:
+                columns = [column for column in chunk.columns if column != args.text_column]
+            if args.keep_text and args.text_column not in columns:
+                columns.append(args.text_column)
+            kept = chunk[columns].reset_index(drop=True)
+
+            in_flight.append(pool.apply_async(_score_chunk, (index, texts, kept, args.batch_size, shard_path)))
+            if len(in_flight) >= 2 * args.workers:
+                finish_oldest()
+        while in_flight:
+            finish_oldest()
+    finally:
+        pool.terminate()
+
+    progress['finished'] = True
+    save_progress(args.output, progress)
+    elapsed = time.perf_counter() - start
+    print(f"\nScored {rows_this_run} rows in {elapsed:.1f}s ({rows_this_run / max(elapsed, 1e-9):,.0f} rows/s); "
+          f"{progress['rows']} rows in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
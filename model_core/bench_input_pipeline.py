@@ -0,0 +1,58 @@
+import argparse
+import os
+import resource
+import time
+
+import tensorflow as tf
+
+from data_loader import DataLoader
+
+
+def max_rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_train_dataset(data_loader):
+    # The previous preprocess(): vectorize the whole corpus at once, cache it
+    # and shuffle with a buffer the size of the dataset
+    X, y = data_loader.load_data()
+    data_loader.vectorizer.adapt(X.values)
+    vectorized_text = data_loader.vectorizer(X.values)
+    dataset = tf.data.Dataset.from_tensor_slices((vectorized_text, y))
+    dataset = dataset.cache().shuffle(160000, reshuffle_each_iteration=True).batch(data_loader.batch_size).prefetch(8)
+    return dataset.take(int(len(dataset) * .7))
+
+
+def main():
+    # Peak memory and rows/second for one pass over the training split.
+    # Run each mode in its own process: peak RSS never goes down.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default=os.path.join('jigsaw-toxic-comment-classification-challenge', 'train.csv', 'train.csv'))
+    parser.add_argument('--mode', choices=['streaming', 'legacy'], default='streaming')
+    parser.add_argument('--batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    data_loader = DataLoader(data_path=args.data, batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    if args.mode == 'legacy':
+        train = legacy_train_dataset(data_loader)
+    else:
+        train = data_loader.preprocess()[0]
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = 0
+    for X_batch, _ in train:
+        rows += int(X_batch.shape[0])
+    epoch_time = time.perf_counter() - start
+
+    print(f"Mode: {args.mode}")
+    print(f"Setup (adapt + vectorize/cache): {setup_time:.1f}s")
+    print(f"One training epoch of input: {rows} rows in {epoch_time:.1f}s ({rows / epoch_time:.0f} rows/s)")
+    print(f"Peak RSS: {max_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
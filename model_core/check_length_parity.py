@@ -0,0 +1,74 @@
+import argparse
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from tensorflow.keras.models import load_model
+from tensorflow.keras.layers import TextVectorization
+
+from length_buckets import PARITY_TOLERANCE, predict_bucketed, sequence_lengths
+
+THRESHOLDS = [0.5, 0.4, 0.5, 0.3, 0.5, 0.4]
+CLASS_NAMES = ['toxic', 'severe_toxic', 'obscene', 'threat', 'insult', 'identity_hate']
+
+
+def main():
+    # Compares fixed 1800-token predictions with the length-bucketed path on a
+    # sample of the corpus. Exits non-zero if the scores drift past
+    # PARITY_TOLERANCE so the backend flag is only switched on when safe.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default='./jigsaw-toxic-comment-classification-challenge/train.csv/train.csv')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--tolerance', type=float, default=PARITY_TOLERANCE)
+    args = parser.parse_args()
+
+    with open('vectorizer.pkl', 'rb') as f:
+        config, vocab = pickle.load(f)
+    vectorizer = TextVectorization.from_config(config)
+    vectorizer.set_vocabulary(vocab)
+    model = load_model('toxicity.h5')
+
+    df = pd.read_csv(args.data, encoding='utf-8')
+    texts = df['comment_text'].sample(n=min(args.samples, len(df)), random_state=0).values
+    tokens = vectorizer(texts).numpy()
+
+    def predict(x):
+        return model.predict(x, batch_size=args.batch_size, verbose=0)
+
+    # Warm up both paths so tracing is not counted in the timings
+    predict(tokens[:args.batch_size])
+    predict_bucketed(predict, tokens[:args.batch_size])
+
+    start = time.perf_counter()
+    fixed = predict(tokens)
+    fixed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bucketed = predict_bucketed(predict, tokens)
+    bucketed_time = time.perf_counter() - start
+
+    diff = np.abs(fixed - bucketed)
+    thresholds = np.array(THRESHOLDS)
+    agreement = ((fixed > thresholds) == (bucketed > thresholds)).mean(axis=0)
+
+    print(f"Samples: {len(texts)}  median length: {int(np.median(sequence_lengths(tokens)))} tokens")
+    print(f"Fixed-length: {fixed_time:.2f}s ({fixed_time / len(texts) * 1000:.2f} ms/comment)")
+    print(f"Bucketed:     {bucketed_time:.2f}s ({bucketed_time / len(texts) * 1000:.2f} ms/comment)")
+    print(f"Speedup: {fixed_time / bucketed_time:.1f}x")
+    print("\nPer-class max |diff| / label agreement:")
+    for i, name in enumerate(CLASS_NAMES):
+        print(f"{name}: {diff[:, i].max():.4f} / {agreement[i]:.4f}")
+
+    max_diff = diff.max()
+    print(f"\nMax |diff|: {max_diff:.4f} (tolerance {args.tolerance})")
+    if max_diff > args.tolerance:
+        print("FAIL: bucketed scores exceed tolerance, keep DYNAMIC_SEQUENCE_LENGTH off")
+        sys.exit(1)
+    print("OK: bucketed scores within tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Vectorizer settings that change the vocabulary or the token ids
+KEY_CONFIG_FIELDS = ('max_tokens', 'output_sequence_length', 'standardize', 'split', 'ngrams', 'output_mode')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CorpusCache:
+    """Content-addressed cache of the adapted vocabulary and the encoded corpus.
+
+    The directory name is derived from the CSV's hash and the vectorizer
+    settings, so editing either simply misses the cache. Each shard stores
+    rows ragged (flat int32 tokens + row offsets, padding dropped) along with
+    uint8 labels, all as ``.npy`` files that load memory-mapped.
+    """
+
+    def __init__(self, root, data_path, vectorizer_config, shard_rows=50000):
+        self.root = root
+        self.data_path = data_path
+        self.shard_rows = shard_rows
+        self.config = {field: vectorizer_config.get(field) for field in KEY_CONFIG_FIELDS}
+        key_source = json.dumps({'csv': file_sha256(data_path), 'config': self.config}, sort_keys=True)
+        self.key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(root, self.key)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, 'meta.json'))
+
+    @property
+    def meta(self):
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            return json.load(f)
+
+    def load_vocabulary(self):
+        # Full get_vocabulary() list, padding and OOV tokens included
+        with open(os.path.join(self.path, 'vocab.txt'), encoding='utf-8') as f:
+            return f.read().split('\n')[:-1]
+
+    def build(self, vectorizer, chunks, label_columns):
+        """Encode ``(offset, texts, labels)`` chunks with an adapted ``vectorizer``."""
+        tmp_path = f"{self.path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        with open(os.path.join(tmp_path, 'vocab.txt'), 'w', encoding='utf-8') as f:
+            for token in vectorizer.get_vocabulary():
+                f.write(f"{token}\n")
+
+        shards = []
+        pending = {'tokens': [], 'lengths': [], 'labels': []}
+        pending_rows = 0
+
+        def flush():
+            lengths = np.concatenate(pending['lengths'])
+            offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            name = f"{len(shards):05d}"
+            np.save(os.path.join(tmp_path, f'tokens-{name}.npy'), np.concatenate(pending['tokens']))
+            np.save(os.path.join(tmp_path, f'offsets-{name}.npy'), offsets)
+            np.save(os.path.join(tmp_path, f'labels-{name}.npy'), np.concatenate(pending['labels']))
+            shards.append({'name': name, 'rows': int(len(lengths))})
+
+        for _, texts, labels in chunks:
+            tokens = np.asarray(vectorizer(texts)).astype(np.int32)
+            lengths = np.count_nonzero(tokens, axis=1)
+            # Row-major selection keeps each row's real tokens contiguous
+            pending['tokens'].append(tokens[np.arange(tokens.shape[1]) < lengths[:, None]])
+            pending['lengths'].append(lengths)
+            pending['labels'].append(np.asarray(labels, dtype=np.uint8))
+            pending_rows += len(texts)
+            if pending_rows >= self.shard_rows:
+                flush()
+                pending = {'tokens': [], 'lengths': [], 'labels': []}
+                pending_rows = 0
+        if pending_rows:
+            flush()
+
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'data_path': self.data_path,
+                'config': self.config,
+                'label_columns': list(label_columns),
+                'rows': sum(shard['rows'] for shard in shards),
+                'shards': shards,
+            }, f, indent=2)
+
+        # Only a complete cache ever appears under the final name
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.rename(tmp_path, self.path)
+
+    def iter_shards(self):
+        """Yield ``(first_row, tokens, offsets, labels)`` per shard, memory-mapped."""
+        first_row = 0
+        for shard in self.meta['shards']:
+            name = shard['name']
+            yield (
+                first_row,
+                np.load(os.path.join(self.path, f'tokens-{name}.npy'), mmap_mode='r'),
+                np.load(os.path.join(self.path, f'offsets-{name}.npy'), mmap_mode='r'),
+                np.load(os.path.join(self.path, f'labels-{name}.npy'), mmap_mode='r'),
+            )
+            first_row += shard['rows']
@@ -1,18 +1,39 @@
+import numpy as np
 import pandas as pd
 import tensorflow as tf
 from tensorflow.keras.layers import TextVectorization
+from corpus_cache import CorpusCache
+
+SPLITS = {'train': (0.0, 0.7), 'val': (0.7, 0.9), 'test': (0.9, 1.0)}
+
+
+def split_fraction(row_index, seed):
+    # Deterministic pseudo-random position in [0, 1) for each CSV row, so a
+    # row always lands in the same split regardless of shuffling or chunking
+    mixed = (np.asarray(row_index, dtype=np.uint64) + np.uint64(seed)) * np.uint64(2654435761)
+    return (mixed % np.uint64(2 ** 32)).astype(np.float64) / 2 ** 32
+
 
 class DataLoader:
-    def __init__(self, data_path, max_features=200000, sequence_length=1800, batch_size=16):
+    def __init__(self, data_path, max_features=200000, sequence_length=1800, batch_size=16,
+                 chunk_size=10000, shuffle_buffer=10000, split_seed=42, cache_dir='corpus_cache'):
         self.data_path = data_path
         self.max_features = max_features
         self.sequence_length = sequence_length
         self.batch_size = batch_size
+        # Rows parsed from the CSV at a time, and rows held for shuffling
+        self.chunk_size = chunk_size
+        self.shuffle_buffer = shuffle_buffer
+        self.split_seed = split_seed
+        # Adapted vocabulary + encoded corpus shared across runs; None disables
+        self.cache_dir = cache_dir
+        self.cache = None
         self.vectorizer = TextVectorization(
             max_tokens=self.max_features,
             output_sequence_length=self.sequence_length,
             output_mode='int'
         )
+        self.label_columns = list(pd.read_csv(self.data_path, nrows=0).columns[2:])
 
     def load_data(self):
         df = pd.read_csv(self.data_path)
@@ -20,26 +41,103 @@ class DataLoader:
         y = df[df.columns[2:]].values
         return X, y
 
-    def preprocess(self, X, y):
-        # Add print statements to debug the data shape
-        print(f"X shape before vectorization: {X.shape}")
-        print(f"y shape: {y.shape}")
-        
-        self.vectorizer.adapt(X.values)
-        vectorized_text = self.vectorizer(X.values)
-        
-        # Check the vectorized data
-        print(f"Vectorized text shape: {vectorized_text.shape}")
-        print(f"Max index in vectorized text: {tf.reduce_max(vectorized_text)}")
-        
-        dataset = tf.data.Dataset.from_tensor_slices((vectorized_text, y))
-        dataset = dataset.cache().shuffle(160000, reshuffle_each_iteration=True).batch(self.batch_size).prefetch(8)
-        
-        # Get the total size of the dataset
-        dataset_size = tf.data.experimental.cardinality(dataset).numpy()
-        print(f"Dataset size (number of batches): {dataset_size}")
-        
-        train = dataset.take(int(len(dataset) * .7))
-        val = dataset.skip(int(len(dataset) * .7)).take(int(len(dataset) * .2))
-        test = dataset.skip(int(len(dataset) * .9)).take(int(len(dataset) * .1))
+    def iter_chunks(self):
+        """Yield ``(first_row, texts, labels)`` for each chunk of the CSV."""
+        offset = 0
+        for chunk in pd.read_csv(self.data_path, chunksize=self.chunk_size):
+            yield offset, chunk['comment_text'].values, chunk[self.label_columns].values.astype(np.int64)
+            offset += len(chunk)
+
+    def split_rows(self, first_row, rows, split):
+        # Positions within a chunk/shard that belong to ``split``
+        if split is None:
+            return np.arange(rows)
+        low, high = SPLITS[split]
+        fraction = split_fraction(np.arange(first_row, first_row + rows), self.split_seed)
+        return np.flatnonzero((fraction >= low) & (fraction < high))
+
+    def iter_rows(self, split=None):
+        """Yield ``(text, labels)`` from the CSV chunk by chunk, optionally for one split."""
+        for offset, texts, labels in self.iter_chunks():
+            for i in self.split_rows(offset, len(texts), split):
+                yield texts[i], labels[i]
+
+    def iter_cached_rows(self, split):
+        """Yield ``(tokens, labels)`` from the corpus cache, padding stripped."""
+        for first_row, tokens, offsets, labels in self.cache.iter_shards():
+            for i in self.split_rows(first_row, len(labels), split):
+                yield tokens[offsets[i]:offsets[i + 1]], labels[i].astype(np.int64)
+
+    def text_dataset(self, split=None):
+        return tf.data.Dataset.from_generator(
+            lambda: self.iter_rows(split),
+            output_signature=(
+                tf.TensorSpec(shape=(), dtype=tf.string),
+                tf.TensorSpec(shape=(len(self.label_columns),), dtype=tf.int64),
+            ),
+        )
+
+    def make_dataset(self, split, shuffle=False):
+        if self.cache is not None:
+            return self.make_cached_dataset(split, shuffle)
+        dataset = self.text_dataset(split)
+        if shuffle:
+            dataset = dataset.shuffle(self.shuffle_buffer, seed=self.split_seed, reshuffle_each_iteration=True)
+        # Vectorize whole batches in parallel instead of the full corpus up front
+        dataset = dataset.batch(self.batch_size).map(
+            lambda text, labels: (self.vectorizer(text), labels),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def make_cached_dataset(self, split, shuffle=False):
+        dataset = tf.data.Dataset.from_generator(
+            lambda: self.iter_cached_rows(split),
+            output_signature=(
+                tf.TensorSpec(shape=(None,), dtype=tf.int32),
+                tf.TensorSpec(shape=(len(self.label_columns),), dtype=tf.int64),
+            ),
+        )
+        if shuffle:
+            dataset = dataset.shuffle(self.shuffle_buffer, seed=self.split_seed, reshuffle_each_iteration=True)
+        # Re-pad to the fixed length the model was built for
+        dataset = dataset.padded_batch(
+            self.batch_size,
+            padded_shapes=([self.sequence_length], [len(self.label_columns)]),
+        )
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def adapt(self):
+        # Streams the corpus through adapt() rather than holding it in memory
+        self.vectorizer.adapt(self.text_dataset().map(lambda text, labels: text).batch(1024))
+
+    def prepare_vectorizer(self):
+        """Adapt the vectorizer, or load its vocabulary from the corpus cache.
+
+        On a cache miss the corpus is encoded into the cache right after
+        adapting, so the next run (of this or save_vector.py) skips both.
+        """
+        if not self.cache_dir:
+            self.adapt()
+            return self.vectorizer
+
+        cache = CorpusCache(self.cache_dir, self.data_path, self.vectorizer.get_config())
+        if cache.exists():
+            print(f"Using corpus cache {cache.path}")
+            self.vectorizer.set_vocabulary(cache.load_vocabulary())
+        else:
+            print(f"Building corpus cache {cache.path}")
+            self.adapt()
+            cache.build(self.vectorizer, self.iter_chunks(), self.label_columns)
+        self.cache = cache
+        return self.vectorizer
+
+    def preprocess(self):
+        self.prepare_vectorizer()
+        print(f"Vocabulary size: {self.vectorizer.vocabulary_size()}")
+
+        # Splits are fixed by CSV row index, so val/test never leak into train
+        train = self.make_dataset('train', shuffle=True)
+        val = self.make_dataset('val')
+        test = self.make_dataset('test')
         return train, val, test, self.vectorizer
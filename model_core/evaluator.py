@@ -1,145 +1,160 @@
-from tensorflow.keras.metrics import Precision, Recall, AUC
 import numpy as np
+from length_buckets import predict_bucketed
+from prediction_store import save_predictions
+
+CLASS_NAMES = ['toxic', 'severe_toxic', 'obscene', 'threat', 'insult', 'identity_hate']
+
+
+def _safe_divide(numerator, denominator):
+    # Matches Keras' divide_no_nan: 0 where the denominator is 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def confusion_counts(y_true, y_pred):
+    """Per-class ``(n_classes, 4)`` matrix of TP, FP, TN, FN for binary arrays."""
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+    tp = np.sum(y_pred & y_true, axis=0)
+    fp = np.sum(y_pred & ~y_true, axis=0)
+    fn = np.sum(~y_pred & y_true, axis=0)
+    tn = len(y_true) - tp - fp - fn
+    return np.stack([tp, fp, tn, fn], axis=-1)
+
+
+def threshold_counts(y_true, scores, thresholds):
+    """TP, FP, TN, FN at every threshold in one pass, predicting ``score > threshold``.
+
+    Scores are bucketed against the sorted ``thresholds`` with one
+    ``searchsorted`` and the per-threshold counts come from reversed
+    cumulative histograms, so thousands of thresholds cost about the same
+    as one.
+    """
+    y_true = np.asarray(y_true).ravel().astype(bool)
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    num_thresholds = len(thresholds)
+
+    # Number of thresholds strictly below each score: a score counts as a
+    # positive prediction at threshold t iff t < bucket
+    buckets = np.searchsorted(thresholds, scores, side='left')
+    pos_hist = np.bincount(buckets[y_true], minlength=num_thresholds + 1)
+    neg_hist = np.bincount(buckets[~y_true], minlength=num_thresholds + 1)
+    tp = np.cumsum(pos_hist[::-1])[::-1][1:]
+    fp = np.cumsum(neg_hist[::-1])[::-1][1:]
+    fn = y_true.sum() - tp
+    tn = (~y_true).sum() - fp
+    return tp, fp, tn, fn
+
+
+def roc_auc(y_true, scores, num_thresholds=200):
+    """ROC AUC with the same threshold grid and interpolation as ``tf.keras.metrics.AUC()``."""
+    epsilon = 1e-7
+    thresholds = np.concatenate([
+        [0.0 - epsilon],
+        (np.arange(num_thresholds - 2) + 1) / (num_thresholds - 1),
+        [1.0 + epsilon],
+    ])
+    tp, fp, tn, fn = threshold_counts(y_true, scores, thresholds)
+
+    tpr = _safe_divide(tp, tp + fn)
+    fpr = _safe_divide(fp, fp + tn)
+    return float(np.sum((fpr[:-1] - fpr[1:]) * (tpr[:-1] + tpr[1:]) / 2))
+
 
 class Evaluator:
-    def __init__(self, model, vectorizer, thresholds=None):
+    def __init__(self, model, vectorizer, thresholds=None, dynamic_length=False, predict_batch_size=256):
         self.model = model
         self.vectorizer = vectorizer
         self.thresholds = thresholds if thresholds else [0.5] * 6  # Default threshold 0.5 for all classes
+        # Trim padding per length bucket instead of running all 1800 steps
+        self.dynamic_length = dynamic_length
+        self.predict_batch_size = predict_batch_size
 
-    def evaluate(self, test_data):
-        # Overall metrics
-        pre, re, auc = Precision(), Recall(), AUC()
-
-        # Per-class metrics storage
-        class_metrics = {
-            "precision": [Precision() for _ in range(6)],
-            "recall": [Recall() for _ in range(6)],
-            "auc": [AUC() for _ in range(6)],
-            "false_positives": [0] * 6,
-            "false_negatives": [0] * 6,
-            "true_positives": [0] * 6,
-            "true_negatives": [0] * 6
-        }
+    def _predict_tokens(self, tokens):
+        def predict(x):
+            return self.model.predict(x, batch_size=self.predict_batch_size, verbose=0)
+
+        if self.dynamic_length:
+            return predict_bucketed(predict, tokens)
+        return predict(tokens)
+
+    def collect_predictions(self, test_data, chunk_rows=8192):
+        """Run the model over ``test_data`` once; returns ``(yhat, y_true)`` arrays.
+
+        Inputs and labels are read in a single pass (the dataset reshuffles on
+        every iteration) and predicted in large chunks rather than per batch.
+        """
+        predictions, labels = [], []
+        pending_x, pending_y, pending_rows = [], [], 0
+
+        def flush():
+            predictions.append(self._predict_tokens(np.concatenate(pending_x)))
+            labels.append(np.concatenate(pending_y))
 
         for X_true, y_true in test_data.as_numpy_iterator():
-            yhat = self.model.predict(X_true)
-            
-            # Apply per-class threshold
-            yhat_binary = (yhat >= np.array(self.thresholds)).astype(int)
-
-            # Update overall metrics
-            pre.update_state(y_true.flatten(), yhat_binary.flatten())
-            re.update_state(y_true.flatten(), yhat_binary.flatten())
-            auc.update_state(y_true.flatten(), yhat.flatten())  # Raw probabilities
-
-            # Update per-class metrics
-            for class_idx in range(6):
-                class_metrics["precision"][class_idx].update_state(y_true[:, class_idx], yhat_binary[:, class_idx])
-                class_metrics["recall"][class_idx].update_state(y_true[:, class_idx], yhat_binary[:, class_idx])
-                class_metrics["auc"][class_idx].update_state(y_true[:, class_idx], yhat[:, class_idx])
-
-                # Compute TP, FP, TN, FN
-                class_metrics["true_positives"][class_idx] += np.sum((yhat_binary[:, class_idx] == 1) & (y_true[:, class_idx] == 1))
-                class_metrics["false_positives"][class_idx] += np.sum((yhat_binary[:, class_idx] == 1) & (y_true[:, class_idx] == 0))
-                class_metrics["true_negatives"][class_idx] += np.sum((yhat_binary[:, class_idx] == 0) & (y_true[:, class_idx] == 0))
-                class_metrics["false_negatives"][class_idx] += np.sum((yhat_binary[:, class_idx] == 0) & (y_true[:, class_idx] == 1))
-
-        # Compute per-class F1-score
-        per_class_f1 = [
-            (2 * class_metrics["precision"][i].result().numpy() * class_metrics["recall"][i].result().numpy()) /
-            (class_metrics["precision"][i].result().numpy() + class_metrics["recall"][i].result().numpy() + 1e-7)
-            for i in range(6)
-        ]
-
-        # Compute per-class Specificity (TNR = TN / (TN + FP))
-        per_class_specificity = [
-            class_metrics["true_negatives"][i] / (class_metrics["true_negatives"][i] + class_metrics["false_positives"][i] + 1e-7)
-            for i in range(6)
-        ]
-
-        # Compute per-class MCC (Matthews Correlation Coefficient)
-        per_class_mcc = [
-            (class_metrics["true_positives"][i] * class_metrics["true_negatives"][i] - class_metrics["false_positives"][i] * class_metrics["false_negatives"][i]) /
-            (np.sqrt(
-                (class_metrics["true_positives"][i] + class_metrics["false_positives"][i]) *
-                (class_metrics["true_positives"][i] + class_metrics["false_negatives"][i]) *
-                (class_metrics["true_negatives"][i] + class_metrics["false_positives"][i]) *
-                (class_metrics["true_negatives"][i] + class_metrics["false_negatives"][i]) + 1e-7
-            ))
-            for i in range(6)
-        ]
-
-        # Compute overall accuracy (TP + TN) / (TP + TN + FP + FN)
-        overall_accuracy = np.sum(class_metrics["true_positives"]) + np.sum(class_metrics["true_negatives"])
-        overall_accuracy /= (
-            np.sum(class_metrics["true_positives"]) + 
-            np.sum(class_metrics["true_negatives"]) + 
-            np.sum(class_metrics["false_positives"]) + 
-            np.sum(class_metrics["false_negatives"]) + 1e-7
-        )
+            pending_x.append(X_true)
+            pending_y.append(y_true)
+            pending_rows += len(X_true)
+            if pending_rows >= chunk_rows:
+                flush()
+                pending_x, pending_y, pending_rows = [], [], 0
+        if pending_rows:
+            flush()
+
+        return np.concatenate(predictions), np.concatenate(labels)
+
+    def evaluate(self, test_data, prediction_store=None):
+        yhat, y_true = self.collect_predictions(test_data)
+        # Keep the raw probabilities so thresholds can be tuned without
+        # running the model again (see threshold_sweep.py)
+        if prediction_store:
+            save_predictions(prediction_store, yhat, y_true, CLASS_NAMES)
+        return self.compute_metrics(yhat, y_true)
+
+    def compute_metrics(self, yhat, y_true):
+        # Apply per-class threshold
+        yhat_binary = yhat >= np.array(self.thresholds)
+
+        # Rows are classes, columns are TP, FP, TN, FN
+        counts = confusion_counts(y_true, yhat_binary).astype(np.float64)
+        tp, fp, tn, fn = counts.T
+
+        precision = _safe_divide(tp, tp + fp)
+        recall = _safe_divide(tp, tp + fn)
+        per_class_f1 = (2 * precision * recall) / (precision + recall + 1e-7)
+        # Specificity (TNR = TN / (TN + FP))
+        per_class_specificity = tn / (tn + fp + 1e-7)
+        # MCC (Matthews Correlation Coefficient)
+        per_class_mcc = (tp * tn - fp * fn) / np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn) + 1e-7)
+        per_class_auc = [roc_auc(y_true[:, i], yhat[:, i]) for i in range(len(CLASS_NAMES))]
+
+        total_tp, total_fp, total_tn, total_fn = counts.sum(axis=0)
+        # Overall accuracy (TP + TN) / (TP + TN + FP + FN)
+        overall_accuracy = (total_tp + total_tn) / (total_tp + total_tn + total_fp + total_fn + 1e-7)
 
         return {
             'overall_metrics': {
-                'precision': pre.result().numpy(),
-                'recall': re.result().numpy(),
-                'AUC': auc.result().numpy(),
+                'precision': float(_safe_divide(total_tp, total_tp + total_fp)),
+                'recall': float(_safe_divide(total_tp, total_tp + total_fn)),
+                'AUC': roc_auc(y_true, yhat),
                 'accuracy': overall_accuracy
             },
             'per_class_metrics': {
-                'toxic': {
-                    'AUC': class_metrics["auc"][0].result().numpy(),
-                    'F1-score': per_class_f1[0],
-                    'Specificity': per_class_specificity[0],
-                    'MCC': per_class_mcc[0],
-                    'FP': class_metrics["false_positives"][0],
-                    'FN': class_metrics["false_negatives"][0]
-                },
-                'severe_toxic': {
-                    'AUC': class_metrics["auc"][1].result().numpy(),
-                    'F1-score': per_class_f1[1],
-                    'Specificity': per_class_specificity[1],
-                    'MCC': per_class_mcc[1],
-                    'FP': class_metrics["false_positives"][1],
-                    'FN': class_metrics["false_negatives"][1]
-                },
-                'obscene': {
-                    'AUC': class_metrics["auc"][2].result().numpy(),
-                    'F1-score': per_class_f1[2],
-                    'Specificity': per_class_specificity[2],
-                    'MCC': per_class_mcc[2],
-                    'FP': class_metrics["false_positives"][2],
-                    'FN': class_metrics["false_negatives"][2]
-                },
-                'threat': {
-                    'AUC': class_metrics["auc"][3].result().numpy(),
-                    'F1-score': per_class_f1[3],
-                    'Specificity': per_class_specificity[3],
-                    'MCC': per_class_mcc[3],
-                    'FP': class_metrics["false_positives"][3],
-                    'FN': class_metrics["false_negatives"][3]
-                },
-                'insult': {
-                    'AUC': class_metrics["auc"][4].result().numpy(),
-                    'F1-score': per_class_f1[4],
-                    'Specificity': per_class_specificity[4],
-                    'MCC': per_class_mcc[4],
-                    'FP': class_metrics["false_positives"][4],
-                    'FN': class_metrics["false_negatives"][4]
-                },
-                'identity_hate': {
-                    'AUC': class_metrics["auc"][5].result().numpy(),
-                    'F1-score': per_class_f1[5],
-                    'Specificity': per_class_specificity[5],
-                    'MCC': per_class_mcc[5],
-                    'FP': class_metrics["false_positives"][5],
-                    'FN': class_metrics["false_negatives"][5]
+                class_name: {
+                    'AUC': per_class_auc[i],
+                    'F1-score': per_class_f1[i],
+                    'Specificity': per_class_specificity[i],
+                    'MCC': per_class_mcc[i],
+                    'FP': int(fp[i]),
+                    'FN': int(fn[i])
                 }
+                for i, class_name in enumerate(CLASS_NAMES)
             }
         }
 
     def predict(self, texts):
         input_text = self.vectorizer(texts)
-        yhat = self.model.predict(input_text)
-        yhat_thresholded = np.array([yhat[:, i] > self.thresholds[i] for i in range(6)]).T.astype(int)
+        yhat = self._predict_tokens(np.asarray(input_text))
+        yhat_thresholded = (yhat > np.array(self.thresholds)).astype(int)
         return yhat_thresholded
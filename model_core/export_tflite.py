@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import pickle
+import resource
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import load_model
+from tensorflow.keras.layers import TextVectorization
+
+from data_loader import DataLoader
+from evaluator import CLASS_NAMES, roc_auc
+from model_bundle import load_bundle
+
+THRESHOLDS = [0.5, 0.4, 0.5, 0.3, 0.5, 0.4]
+QUANTIZATIONS = ('float32', 'float16', 'dynamic', 'int8')
+
+
+def max_rss_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_artifacts(bundle_path):
+    if os.path.exists(os.path.join(bundle_path, 'manifest.json')):
+        model, vectorizer, _ = load_bundle(bundle_path)
+        return model, vectorizer
+    with open('vectorizer.pkl', 'rb') as f:
+        config, vocab = pickle.load(f)
+    vectorizer = TextVectorization.from_config(config)
+    vectorizer.set_vocabulary(vocab)
+    return load_model('toxicity.h5'), vectorizer
+
+
+def convert(model, sequence_length, quantization, representative_tokens=None):
+    """Convert the Keras model to a TFLite flatbuffer taking int32 token ids."""
+    # A concrete function with a free batch dimension; the interpreter is
+    # resized per batch at serve time
+    serve = tf.function(lambda tokens: model(tokens, training=False))
+    concrete = serve.get_concrete_function(tf.TensorSpec([None, sequence_length], tf.int32, name='tokens'))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'dynamic':
+        # int8 weights, float activations
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == 'int8':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for row in representative_tokens:
+                yield [row[None, :].astype(np.int32)]
+
+        converter.representative_dataset = representative_dataset
+        # Ops without int8 kernels (parts of the LSTM) stay in float
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+        ]
+    return converter.convert()
+
+
+class TFLitePredictor:
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.shape = None
+
+    def predict(self, tokens):
+        tokens = np.ascontiguousarray(tokens, dtype=np.int32)
+        if tokens.shape != self.shape:
+            self.interpreter.resize_tensor_input(self.input_index, tokens.shape)
+            self.interpreter.allocate_tensors()
+            self.shape = tokens.shape
+        self.interpreter.set_tensor(self.input_index, tokens)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def predict_batched(predict, tokens, batch_size):
+    return np.concatenate([predict(tokens[i:i + batch_size]) for i in range(0, len(tokens), batch_size)])
+
+
+def latency_ms(predict, tokens, batch_size, repeats=20):
+    batch = tokens[:batch_size]
+    predict(batch)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'p50': float(np.percentile(timings, 50)), 'p95': float(np.percentile(timings, 95))}
+
+
+def parity_report(keras_scores, lite_scores, labels):
+    thresholds = np.array(THRESHOLDS)
+    agreement = ((keras_scores > thresholds) == (lite_scores > thresholds)).mean(axis=0)
+    diff = np.abs(keras_scores - lite_scores)
+    return {
+        class_name: {
+            'keras_AUC': roc_auc(labels[:, i], keras_scores[:, i]),
+            'tflite_AUC': roc_auc(labels[:, i], lite_scores[:, i]),
+            'label_agreement': float(agreement[i]),
+            'max_abs_diff': float(diff[:, i].max()),
+            'mean_abs_diff': float(diff[:, i].mean()),
+        }
+        for i, class_name in enumerate(CLASS_NAMES)
+    }
+
+
+def main():
+    # Export a TFLite model, then compare it with the Keras model on the
+    # test split: per-class AUC, label agreement at the serving thresholds,
+    # latency and memory
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, default='dynamic')
+    parser.add_argument('--bundle', default='toxicity_bundle', help="used if present, else vectorizer.pkl + toxicity.h5")
+    parser.add_argument('--data', default=os.path.join('jigsaw-toxic-comment-classification-challenge', 'train.csv', 'train.csv'))
+    parser.add_argument('--limit', type=int, default=0, help="test rows to compare (0 = whole split)")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default='toxicity.tflite', help="the backend's TFLITE_MODEL_PATH default")
+    parser.add_argument('--report', default=None, help="default: tflite_report_<quantization>.json")
+    args = parser.parse_args()
+    output = args.output
+    report_path = args.report or f'tflite_report_{args.quantization}.json'
+
+    rss_before = max_rss_mb()
+    model, vectorizer = load_artifacts(args.bundle)
+    keras_rss = max_rss_mb() - rss_before
+
+    # Same deterministic test split as training, tokenized by the deployed
+    # vectorizer so both engines see exactly what the backend sends them
+    data_loader = DataLoader(data_path=args.data, batch_size=args.batch_size)
+    texts, labels = [], []
+    for text, row_labels in data_loader.iter_rows('test'):
+        texts.append(str(text))
+        labels.append(row_labels)
+        if args.limit and len(texts) >= args.limit:
+            break
+    tokens = np.concatenate([
+        vectorizer(texts[start:start + args.batch_size]).numpy()
+        for start in range(0, len(texts), args.batch_size)
+    ]).astype(np.int32)
+    labels = np.array(labels)
+
+    print(f"Converting ({args.quantization})...")
+    flatbuffer = convert(model, tokens.shape[1], args.quantization, representative_tokens=tokens[:200])
+    with open(output, 'wb') as f:
+        f.write(flatbuffer)
+
+    rss_before = max_rss_mb()
+    lite = TFLitePredictor(output, num_threads=args.threads)
+    lite.predict(tokens[:1])
+    lite_rss = max_rss_mb() - rss_before
+
+    def keras_predict(x):
+        return model.predict(x, batch_size=len(x), verbose=0)
+
+    print(f"Scoring {len(tokens)} test rows with both engines...")
+    keras_scores = predict_batched(keras_predict, tokens, args.batch_size)
+    lite_scores = predict_batched(lite.predict, tokens, args.batch_size)
+
+    report = {
+        'quantization': args.quantization,
+        'tflite_path': output,
+        'rows': int(len(tokens)),
+        'size_mb': {'tflite': round(os.path.getsize(output) / 2 ** 20, 2)},
+        # Peak-RSS growth while loading each engine; rough, process-wide
+        'load_rss_mb': {'keras': round(keras_rss, 1), 'tflite': round(lite_rss, 1)},
+        'latency_ms': {
+            engine: {f'batch_{size}': latency_ms(predict, tokens, size) for size in (1, args.batch_size)}
+            for engine, predict in (('keras', keras_predict), ('tflite', lite.predict))
+        },
+        'parity': parity_report(keras_scores, lite_scores, labels),
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nWrote {output} ({report['size_mb']['tflite']} MB) and {report_path}")
+    for class_name, parity in report['parity'].items():
+        print(f"{class_name}: AUC {parity['keras_AUC']:.4f} -> {parity['tflite_AUC']:.4f}, "
+              f"label agreement {parity['label_agreement']:.4f}, max |diff| {parity['max_abs_diff']:.4f}")
+    for engine, latencies in report['latency_ms'].items():
+        print(f"{engine}: " + ", ".join(f"{name} p50 {value['p50']:.1f} ms" for name, value in latencies.items()))
+
+
+if __name__ == "__main__":
+    main()
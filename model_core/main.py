@@ -1,41 +1,92 @@
+import argparse
+import contextlib
 import os
+import tempfile
+import tensorflow as tf
 from data_loader import DataLoader
 from model_builder import ToxicityModel
-from trainer import Trainer
+from trainer import Trainer, configure_threads, is_chief, make_strategy, scaled_learning_rate
 from evaluator import Evaluator
+from model_bundle import export_bundle
 from sklearn.utils.class_weight import compute_class_weight
 import numpy as np
-import pandas as pd
+
+
+def parse_args():
+    # Defaults reproduce the original single-process training run
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--batch-size', type=int, default=16, help="per replica")
+    parser.add_argument('--scale-lr', action='store_true', help="scale Adam's learning rate linearly with the global batch size")
+    parser.add_argument('--intra-op-threads', type=int, default=0, help="0 = TensorFlow default")
+    parser.add_argument('--inter-op-threads', type=int, default=0, help="0 = TensorFlow default")
+    parser.add_argument('--jit-compile', action='store_true', help="XLA-compile the train step")
+    parser.add_argument('--steps-per-execution', type=int, default=1)
+    parser.add_argument('--strategy', choices=['none', 'mirrored', 'multi_worker'], default='none')
+    parser.add_argument('--perf-log', default='training_perf.json', help="per-epoch timings and samples/s")
+    parser.add_argument('--bundle', default='toxicity_bundle', help="model bundle to write after training; empty to skip")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    # Thread pools and the strategy have to be set up before any other TF op
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    strategy = make_strategy(args.strategy)
+    replicas = strategy.num_replicas_in_sync if strategy else 1
+    global_batch_size = args.batch_size * replicas
 
     # Load and preprocess data
-    data_loader = DataLoader(data_path=os.path.join('jigsaw-toxic-comment-classification-challenge','train.csv', 'train.csv'))
-    X, y = data_loader.load_data()
-    train, val, test, vectorizer = data_loader.preprocess(X, y)
-    df = pd.DataFrame(train)
-    print(df.head())
+    data_loader = DataLoader(
+        data_path=os.path.join('jigsaw-toxic-comment-classification-challenge','train.csv', 'train.csv'),
+        batch_size=global_batch_size
+    )
+    # Rows are streamed from the CSV and vectorized per batch
+    train, val, test, vectorizer = data_loader.preprocess()
+    if strategy:
+        # Generator-backed datasets can't be sharded by file
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+        train, val = train.with_options(options), val.with_options(options)
+
     # Build and train model
-    model_builder = ToxicityModel()
-    model = model_builder.build_model()
-    epochs = 15
+    learning_rate = scaled_learning_rate(global_batch_size) if args.scale_lr else None
+    with strategy.scope() if strategy else contextlib.nullcontext():
+        model_builder = ToxicityModel()
+        model = model_builder.build_model(
+            learning_rate=learning_rate,
+            jit_compile=args.jit_compile,
+            steps_per_execution=args.steps_per_execution
+        )
+    epochs = args.epochs
     embedding_layer = model.layers[0]
 
     print(f"\nConfiguration:")
     print(f"Number of epochs: {epochs}")
-    print(f"Batch Size: {data_loader.batch_size}")
+    print(f"Batch Size: {data_loader.batch_size} ({replicas} replica(s))")
     print(f"Sequence Length: {data_loader.sequence_length}")
     print(f"Max features: {data_loader.max_features}")
     print(f"Output dim (embedding dimension): {embedding_layer.output_dim}")
-    print(f"Optimizer: {model.optimizer.get_config()['name']}")
+    print(f"Optimizer: {model.optimizer.get_config()['name']} (learning rate {float(model.optimizer.learning_rate):g})")
     print(f"Loss FUnction: {model.loss}")
+    print(f"Threads: intra-op {tf.config.threading.get_intra_op_parallelism_threads()}, "
+          f"inter-op {tf.config.threading.get_inter_op_parallelism_threads()} (0 = default)")
+    print(f"XLA: {args.jit_compile}, steps per execution: {args.steps_per_execution}, strategy: {args.strategy}")
 
-
-    trainer = Trainer(model, train, val)
-    trainer.train(epochs=15)
+    # Only the chief worker writes real checkpoints and perf logs
+    chief = is_chief()
+    trainer = Trainer(
+        model, train, val,
+        batch_size=global_batch_size,
+        checkpoint_path='best_model.h5' if chief else os.path.join(tempfile.mkdtemp(), 'best_model.h5'),
+        perf_log=args.perf_log if chief else None
+    )
+    trainer.train(epochs=epochs)
     # trainer.save_model()
     # Evaluate model
     evaluator = Evaluator(model, vectorizer)
-    results = evaluator.evaluate(test)
+    # Raw probabilities are kept for threshold_sweep.py
+    results = evaluator.evaluate(test, prediction_store='predictions' if chief else None)
 
     # Print overall metrics
     print("\nOverall Metrics:")
@@ -55,5 +106,18 @@ def main():
         print(f"False Positives (FP): {metrics['FP']}")
         print(f"False Negatives (FN): {metrics['FN']}")
 
+    if chief and args.bundle:
+        # The fast-loading format the backend prefers. Thresholds are left
+        # out: tune them for this model with threshold_sweep.py first.
+        manifest = export_bundle(
+            args.bundle, model, vectorizer.get_config(), vectorizer.get_vocabulary(),
+            metadata={
+                'epochs': epochs,
+                'batch_size': global_batch_size,
+                'test_auc': float(results['overall_metrics']['AUC']),
+            },
+        )
+        print(f"\nWrote {args.bundle} (version {manifest['version']}, {manifest['vocab_size']} tokens)")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,7 +5,7 @@ class ToxicityModel:
     def __init__(self, max_features=200000):
         self.max_features = max_features
 
-    def build_model(self):
+    def build_model(self, learning_rate=None, jit_compile=False, steps_per_execution=1):
         model = Sequential([
             Embedding(self.max_features + 1, 32),
             Bidirectional(LSTM(64, activation='tanh')),
@@ -20,6 +20,10 @@ class ToxicityModel:
         
         model.compile(
             loss=tf.keras.losses.BinaryCrossentropy(from_logits=False),
-            optimizer='Adam'
+            # Default Adam unless the learning rate is scaled for larger batches
+            optimizer=tf.keras.optimizers.Adam(learning_rate) if learning_rate else 'Adam',
+            # XLA-compiled train steps, several steps per Python round-trip
+            jit_compile=jit_compile,
+            steps_per_execution=steps_per_execution
         )
         return model  
@@ -0,0 +1,112 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+
+BUNDLE_FORMAT = 1
+CLASS_NAMES = ['toxic', 'severe_toxic', 'obscene', 'threat', 'insult', 'identity_hate']
+
+# Written by TextVectorization itself (padding and OOV), not stored in vocab.txt
+RESERVED_TOKENS = 2
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_bundle(path, model, vectorizer_config, vocab, thresholds=None, metadata=None):
+    """Write a versioned model bundle directory.
+
+    Layout::
+
+        manifest.json   format, version, class names, thresholds, vectorizer config
+        vocab.txt       one token per line, loaded by TF straight from the file
+        model.keras     weights and architecture
+
+    The vocabulary is never rebuilt as a Python list at load time: the
+    vectorizer's lookup table is initialized from ``vocab.txt`` directly.
+    """
+    if list(vocab[:RESERVED_TOKENS]) != ['', '[UNK]']:
+        raise ValueError("Vocabulary must start with the padding and OOV tokens from get_vocabulary()")
+    os.makedirs(path, exist_ok=True)
+
+    # Tokens never contain whitespace (the vectorizer splits on it), so one
+    # per line is unambiguous
+    with open(os.path.join(path, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        for token in vocab[RESERVED_TOKENS:]:
+            f.write(f"{token}\n")
+
+    model.save(os.path.join(path, 'model.keras'))
+
+    config = {key: value for key, value in vectorizer_config.items() if key not in ('vocabulary', 'idf_weights')}
+    files = {name: _sha256(os.path.join(path, name)) for name in ('vocab.txt', 'model.keras')}
+    version = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'class_names': CLASS_NAMES,
+        'thresholds': thresholds,
+        'vocab_size': len(vocab),
+        'vectorizer_config': config,
+        'files': files,
+        'metadata': metadata or {},
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_bundle(path):
+    """Load ``(model, vectorizer, manifest)`` from a bundle directory."""
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.layers import TextVectorization
+
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format'] != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest['format']}")
+
+    vectorizer = TextVectorization.from_config(manifest['vectorizer_config'])
+    vectorizer.set_vocabulary(os.path.join(path, 'vocab.txt'))
+    model = load_model(os.path.join(path, 'model.keras'))
+    return model, vectorizer, manifest
+
+
+def main():
+    # Converts the legacy vectorizer.pkl + toxicity.h5 pair into a bundle
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='toxicity.h5')
+    parser.add_argument('--vectorizer', default='vectorizer.pkl')
+    parser.add_argument('--thresholds', default='thresholds.json', help="used if the file exists")
+    parser.add_argument('--output', default='toxicity_bundle')
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    with open(args.vectorizer, 'rb') as f:
+        config, vocab = pickle.load(f)
+    model = load_model(args.model)
+
+    thresholds = None
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)['thresholds']
+
+    manifest = export_bundle(
+        args.output, model, config, vocab,
+        thresholds=thresholds,
+        metadata={'source_model': os.path.basename(args.model), 'source_vectorizer': os.path.basename(args.vectorizer)},
+    )
+    print(f"Wrote {args.output} (version {manifest['version']}, {manifest['vocab_size']} tokens)")
+
+
+if __name__ == "__main__":
+    main()
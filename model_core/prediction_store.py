@@ -0,0 +1,26 @@
+import json
+import os
+
+import numpy as np
+
+
+def save_predictions(path, probs, labels, class_names):
+    """Write raw probabilities and labels as ``.npy`` files under ``path``.
+
+    Probabilities are float32 and labels uint8, so the Jigsaw test split
+    takes a few hundred KB and loads memory-mapped in milliseconds.
+    """
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'probs.npy'), np.asarray(probs, dtype=np.float32))
+    np.save(os.path.join(path, 'labels.npy'), np.asarray(labels, dtype=np.uint8))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'class_names': list(class_names), 'rows': int(len(probs))}, f)
+
+
+def load_predictions(path):
+    """Return ``(probs, labels, class_names)`` with both arrays memory-mapped."""
+    probs = np.load(os.path.join(path, 'probs.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r')
+    with open(os.path.join(path, 'meta.json')) as f:
+        class_names = json.load(f)['class_names']
+    return probs, labels, class_names
@@ -1,13 +1,15 @@
 import pickle
-import pandas as pd
-from tensorflow.keras.layers import TextVectorization
+from data_loader import DataLoader
 
 # Rebuild the vectorizer
 MAX_FEATURES = 200000
-vectorizer = TextVectorization(max_tokens=MAX_FEATURES, output_sequence_length=1800, output_mode='int')
-df = pd.read_csv('./jigsaw-toxic-comment-classification-challenge/train.csv/train.csv', encoding='utf-8')
-X = df['comment_text']
-vectorizer.adapt(X.values)
+data_loader = DataLoader(
+    data_path='./jigsaw-toxic-comment-classification-challenge/train.csv/train.csv',
+    max_features=MAX_FEATURES,
+    sequence_length=1800,
+)
+# Reuses the vocabulary adapted by main.py (or caches it for main.py)
+vectorizer = data_loader.prepare_vectorizer()
 
 # Extract config and vocabulary
 config = vectorizer.get_config()
@@ -1,16 +1,22 @@
+import os
 import pickle
 from tensorflow.keras.models import load_model
 from tensorflow.keras.layers import TextVectorization
+from model_bundle import load_bundle
 
-# Load vectorizer config and vocab
-with open('vectorizer.pkl', 'rb') as f:
-    config, vocab = pickle.load(f)
+if os.path.exists(os.path.join('toxicity_bundle', 'manifest.json')):
+    # Bundle from model_bundle.py: vocab is read by TF straight from vocab.txt
+    model, vectorizer, manifest = load_bundle('toxicity_bundle')
+else:
+    # Load vectorizer config and vocab
+    with open('vectorizer.pkl', 'rb') as f:
+        config, vocab = pickle.load(f)
 
-vectorizer = TextVectorization.from_config(config)
-vectorizer.set_vocabulary(vocab)  # ✅ Key step to avoid "Table not initialized" error
+    vectorizer = TextVectorization.from_config(config)
+    vectorizer.set_vocabulary(vocab)  # ✅ Key step to avoid "Table not initialized" error
 
-# Load trained model
-model = load_model('toxicity.h5')
+    # Load trained model
+    model = load_model('toxicity.h5')
 
 # Predict sample input
 input_text = ["You freaking suck! I am going to hit you."]
@@ -21,4 +27,4 @@ predictions = model.predict(vectorized_input)
 print(f"Prediction: {(predictions > 0.5).astype(int)}")
 
 raw_predictions = model.predict(vectorized_input)
-print(f"Raw predictions: {raw_predictions}")
\ No newline at end of file
+print(f"Raw predictions: {raw_predictions}")
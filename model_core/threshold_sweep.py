@@ -0,0 +1,83 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from evaluator import _safe_divide, threshold_counts
+from prediction_store import load_predictions
+
+
+def sweep_class(labels, scores, candidates, objective='f1', min_recall=0.8):
+    """Pick the candidate threshold that maximizes ``objective`` for one class.
+
+    Predictions are ``score > threshold``, the same rule the backend applies.
+    Objectives: ``f1``, ``mcc`` or ``precision`` (highest precision among
+    thresholds whose recall is at least ``min_recall``).
+    """
+    tp, fp, tn, fn = (c.astype(np.float64) for c in threshold_counts(labels, scores, candidates))
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, tp + fn)
+    f1 = _safe_divide(2 * tp, 2 * tp + fp + fn)
+    mcc = _safe_divide(tp * tn - fp * fn, np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn)))
+
+    if objective == 'f1':
+        best = int(np.argmax(f1))
+    elif objective == 'mcc':
+        best = int(np.argmax(mcc))
+    elif objective == 'precision':
+        eligible = recall >= min_recall
+        if eligible.any():
+            best = int(np.argmax(np.where(eligible, precision, -1.0)))
+        else:
+            # No threshold reaches the floor; take the one with the best recall
+            best = int(np.argmax(recall))
+    else:
+        raise ValueError(f"Unknown objective: {objective}")
+
+    return {
+        'threshold': float(candidates[best]),
+        'precision': float(precision[best]),
+        'recall': float(recall[best]),
+        'F1-score': float(f1[best]),
+        'MCC': float(mcc[best]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune per-class thresholds against a saved prediction store")
+    parser.add_argument('--store', default='predictions', help="directory written by Evaluator.evaluate(prediction_store=...)")
+    parser.add_argument('--objective', choices=['f1', 'mcc', 'precision'], default='f1')
+    parser.add_argument('--min-recall', type=float, default=0.8, help="recall floor for --objective precision")
+    parser.add_argument('--candidates', type=int, default=5000, help="evenly spaced thresholds in (0, 1) to try")
+    parser.add_argument('--output', default='thresholds.json')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    probs, labels, class_names = load_predictions(args.store)
+    candidates = np.linspace(0, 1, args.candidates + 2)[1:-1]
+
+    results = {}
+    for i, class_name in enumerate(class_names):
+        results[class_name] = sweep_class(labels[:, i], probs[:, i], candidates, args.objective, args.min_recall)
+    elapsed = time.perf_counter() - start
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'class_names': class_names,
+            'thresholds': [results[name]['threshold'] for name in class_names],
+            'objective': args.objective,
+            'min_recall': args.min_recall if args.objective == 'precision' else None,
+            'rows': int(len(probs)),
+            'metrics': results,
+        }, f, indent=2)
+
+    print(f"Swept {args.candidates} thresholds x {len(class_names)} classes over {len(probs)} rows in {elapsed:.3f}s")
+    for class_name, metrics in results.items():
+        print(f"{class_name}: threshold {metrics['threshold']:.4f}  precision {metrics['precision']:.4f}  "
+              f"recall {metrics['recall']:.4f}  F1 {metrics['F1-score']:.4f}  MCC {metrics['MCC']:.4f}")
+    print(f"\nWrote {args.output}; copy it to ../backend/ next to toxicity.h5")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Builds the corpus cache once so workers don't race to write it
+PREPARE = """
+import os
+from data_loader import DataLoader
+DataLoader(data_path=os.path.join('jigsaw-toxic-comment-classification-challenge', 'train.csv', 'train.csv')).prepare_vectorizer()
+"""
+
+
+def main():
+    # Data-parallel training across local worker processes with
+    # MultiWorkerMirroredStrategy. Extra arguments go to main.py, e.g.
+    #   python train_workers.py --workers 4 -- --batch-size 64 --scale-lr --jit-compile
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--base-port', type=int, default=23456)
+    parser.add_argument('--threads-per-worker', type=int, default=0, help="intra-op threads; default splits the cores evenly")
+    parser.add_argument('main_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    main_args = [arg for arg in args.main_args if arg != '--']
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    cluster = {'worker': [f'localhost:{args.base_port + i}' for i in range(args.workers)]}
+
+    subprocess.run([sys.executable, '-c', PREPARE], check=True)
+
+    processes = []
+    for index in range(args.workers):
+        env = dict(os.environ)
+        env['TF_CONFIG'] = json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}})
+        command = [
+            sys.executable, 'main.py',
+            '--strategy', 'multi_worker',
+            '--intra-op-threads', str(threads),
+            '--inter-op-threads', '2',
+            *main_args,
+        ]
+        # Only the chief's output is shown
+        output = None if index == 0 else subprocess.DEVNULL
+        processes.append(subprocess.Popen(command, env=env, stdout=output, stderr=output))
+
+    exit_codes = [process.wait() for process in processes]
+    if any(exit_codes):
+        print(f"Worker exit codes: {exit_codes}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,94 @@
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+import json
+import os
+import time
+
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback, EarlyStopping, ModelCheckpoint
+
+
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    # Must run before TensorFlow executes its first op; 0 keeps TF's default
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def scaled_learning_rate(batch_size, base_learning_rate=0.001, base_batch_size=16):
+    # Linear scaling rule: keep the per-sample step size when batches grow
+    return base_learning_rate * batch_size / base_batch_size
+
+
+def make_strategy(name='none'):
+    """Distribution strategy for ``name``: 'none', 'mirrored' or 'multi_worker'.
+
+    'multi_worker' expects TF_CONFIG in the environment, as set by
+    train_workers.py for local worker processes.
+    """
+    if name == 'none':
+        return None
+    if name == 'mirrored':
+        return tf.distribute.MirroredStrategy()
+    if name == 'multi_worker':
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    raise ValueError(f"Unknown strategy: {name}")
+
+
+def is_chief():
+    # Worker 0 (or a run without TF_CONFIG) owns checkpoints and reports
+    task = json.loads(os.environ.get('TF_CONFIG', '{}')).get('task', {})
+    return task.get('index', 0) == 0
+
+
+class ThroughputLogger(Callback):
+    """Logs per-epoch wall time and training samples per second."""
+
+    def __init__(self, batch_size, log_path=None):
+        super().__init__()
+        self.batch_size = batch_size
+        self.log_path = log_path
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._batches = 0
+        self._start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        # With steps_per_execution > 1 Keras calls this once per group of
+        # steps, passing the index of the group's last step
+        self._batches = batch + 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._start
+        # The last batch may be short, so this slightly overestimates
+        samples = self._batches * self.batch_size
+        record = {
+            'epoch': epoch + 1,
+            'seconds': round(seconds, 2),
+            'samples': samples,
+            'samples_per_second': round(samples / seconds, 1),
+        }
+        self.epochs.append(record)
+        print(f"\nEpoch {epoch + 1}: {seconds:.1f}s, {record['samples_per_second']:.0f} samples/s")
+        if self.log_path:
+            with open(self.log_path, 'w') as f:
+                json.dump({'batch_size': self.batch_size, 'epochs': self.epochs}, f, indent=2)
+
 
 class Trainer:
-    def __init__(self, model, train_data, val_data):
+    def __init__(self, model, train_data, val_data, batch_size=16, checkpoint_path='best_model.h5', perf_log=None):
         self.model = model
         self.train_data = train_data
         self.val_data = val_data
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.perf_log = perf_log
 
     def train(self, epochs=15):
         callbacks = [
             EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True),
-            ModelCheckpoint(filepath='best_model.h5', save_best_only=True, monitor='val_loss')
+            ModelCheckpoint(filepath=self.checkpoint_path, save_best_only=True, monitor='val_loss'),
+            ThroughputLogger(self.batch_size, self.perf_log)
         ]
         history = self.model.fit(
             self.train_data,
@@ -17,7 +96,7 @@ class Trainer:
             validation_data=self.val_data,
             callbacks=callbacks,
             shuffle=False,
-        )        
+        )
         return history
     def save_model(self, path='toxicity.h5'):
         self.model.save(path)